@@ -1,5 +1,6 @@
 from django.apps import apps as django_apps
 from django.contrib import admin
+from django.db.models import OuterRef, Subquery
 
 from django_revision.modeladmin_mixin import ModelAdminRevisionMixin
 from edc_model_admin import ModelAdminBasicMixin
@@ -14,7 +15,7 @@ from edc_model_admin import (
 
 from .admin_site import edc_call_manager_admin
 from .constants import NEW_CALL, OPEN_CALL
-from .models import Call, Log, LogEntry
+from .models import Call, CallSummary, Log, LogEntry, SchedulerJob
 from edc_model_admin.changelist_buttons import ModelAdminChangelistModelButtonMixin
 
 
@@ -70,10 +71,21 @@ class ModelAdminCallMixin(ModelAdminChangelistModelButtonMixin, ModelAdminBasicM
 
     mixin_search_fields = ('subject_identifier', 'initials', 'label')
 
-    def call_button(self, obj):
+    def get_queryset(self, request):
+        """Annotates the pk of the call's log so `call_button` does not query per row."""
         Log = django_apps.get_model('edc_call_manager', 'log')
-        log = Log.objects.get(call=obj)
-        args = (log.call.label, str(log.pk))
+        return super().get_queryset(request).annotate(
+            log_pk=Subquery(Log.objects.filter(call=OuterRef('pk')).order_by().values('pk')[:1]))
+
+    def call_button(self, obj):
+        try:
+            log_pk = obj.log_pk
+        except AttributeError:
+            Log = django_apps.get_model('edc_call_manager', 'log')
+            log_pk = Log.objects.filter(call=obj).values_list('pk', flat=True).first()
+        if not log_pk:
+            return self.get_empty_value_display()
+        args = (obj.label, str(log_pk))
         if obj.call_status == NEW_CALL:
             change_label = f'New&nbsp;Call {obj.call_attempts}'
         elif obj.call_status == OPEN_CALL:
@@ -212,3 +224,22 @@ class LogAdmin(ModelAdminMixin, admin.ModelAdmin):
 @admin.register(LogEntry, site=edc_call_manager_admin)
 class LogEntryAdmin(ModelAdminMixin, ModelAdminLogEntryMixin, admin.ModelAdmin):
     pass
+
+
+@admin.register(SchedulerJob, site=edc_call_manager_admin)
+class SchedulerJobAdmin(ModelAdminMixin, admin.ModelAdmin):
+
+    list_display = ('job_type', 'label', 'subject_identifier', 'status', 'attempts',
+                    'available_datetime', 'locked_by', 'completed_datetime')
+
+    list_filter = ('status', 'job_type', 'label')
+
+    search_fields = ('subject_identifier', 'label')
+
+
+@admin.register(CallSummary, site=edc_call_manager_admin)
+class CallSummaryAdmin(ModelAdminMixin, admin.ModelAdmin):
+
+    list_display = ('label', 'call_status', 'scheduled', 'shard', 'count')
+
+    list_filter = ('label', 'call_status')
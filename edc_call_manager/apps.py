@@ -12,26 +12,31 @@ class AppConfig(DjangoAppConfig):
     name = 'edc_call_manager'
     verbose_name = 'EDC Call Manager'
     admin_site_name = 'edc_call_manager_admin'
+    lazy_autodiscover = False  # if True, model_callers modules are imported on first use
+    verbose = False  # if True, write each model caller registered to stdout
 
     def ready(self):
-        from edc_call_manager import signals
         from edc_call_manager.caller_site import site_model_callers
         sys.stdout.write(f'Loading {self.verbose_name} ...\n')
-        sys.stdout.write(f' * call models are in app {self.name}.\n')
-        site_model_callers.autodiscover()
+        site_model_callers.verbose = self.verbose
+        if self.lazy_autodiscover:
+            site_model_callers.autodiscover_lazily()
+            sys.stdout.write(' * model callers will be registered on first use.\n')
+        else:
+            site_model_callers.autodiscover()
         sys.stdout.write(f' Done loading {self.verbose_name}.\n')
 
     @property
     def call_model(self):
-        return django_apps.get_model(self.app_label, 'call')
+        return django_apps.get_model(self.label, 'call')
 
     @property
     def log_model(self):
-        return django_apps.get_model(self.app_label, 'log')
+        return django_apps.get_model(self.label, 'log')
 
     @property
     def log_entry_model(self):
-        return django_apps.get_model(self.app_label, 'logentry')
+        return django_apps.get_model(self.label, 'logentry')
 
 
 class EdcProtocolAppConfig(BaseEdcProtocolAppConfig):
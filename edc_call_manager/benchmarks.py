@@ -0,0 +1,297 @@
+import platform
+import time
+import tracemalloc
+
+from datetime import date, timedelta
+from io import StringIO
+from itertools import count
+
+import django
+
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models.signals import post_save
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from edc_base.utils import get_utcnow
+from edc_constants.constants import ALIVE, CLOSED
+
+from .constants import NEW_CALL, OPEN_CALL
+from .utils import chunked
+
+
+def benchmark_post_save_dispatch(model, number=10000, using=None):
+    """Returns a dictionary of the cost of dispatching post_save for an unsaved
+    instance of `model`.
+
+    For a model not registered with a model caller, the call manager adds no
+    receivers so the cost is that of Django and any other app's receivers only."""
+    instance = model()
+    with CaptureQueriesContext(connection) as context:
+        start = time.perf_counter()
+        for _ in range(number):
+            post_save.send(
+                sender=model, instance=instance, created=True, update_fields=None,
+                raw=False, using=using or 'default')
+        seconds = time.perf_counter() - start
+    return dict(
+        model=model._meta.label_lower,
+        number=number,
+        seconds=seconds,
+        per_dispatch_us=seconds / number * 1000000,
+        queries=len(context.captured_queries))
+
+
+def legacy_get_model_caller(site, param):
+    """The exception-driven lookup `CallerSite.get_model_caller` used before the
+    lookup table, kept for `benchmark_get_model_caller`."""
+    try:
+        model = django_apps.get_model(*param)
+    except (LookupError, TypeError, AttributeError):
+        model = param
+    try:
+        model_caller = site.start_models[model]
+    except KeyError:
+        model_caller = None
+    if not model_caller:
+        try:
+            model_caller = site.model_callers[param]
+        except KeyError:
+            model_caller = None
+    return model_caller
+
+
+def benchmark_get_model_caller(site, params, number=100000):
+    """Returns a dictionary of lookups per second for `site.get_model_caller` before
+    and after the lookup table, cycling through `params`.
+
+    For example:
+
+        benchmark_get_model_caller(
+            site_model_callers, [TestStartModel, LogEntry, 'testmodelcaller1'])
+    """
+    results = {}
+    for name, lookup in [('before', lambda param: legacy_get_model_caller(site, param)),
+                         ('after', site.get_model_caller)]:
+        start = time.perf_counter()
+        for index in range(number):
+            lookup(params[index % len(params)])
+        seconds = time.perf_counter() - start
+        results[name] = dict(number=number, seconds=seconds, lookups_per_second=number / seconds)
+    return results
+
+
+class CallManagerBenchmark:
+    """A benchmark of the call manager hot paths against a seeded call table.
+
+    For each size, `size` calls, each with a log and a start model instance, are
+    seeded with `bulk_create` inside a transaction that is rolled back once the paths
+    are timed, so the database is left as it was. Each path is run `number` times and
+    reported with wall time and query count, then once more with tracemalloc tracing
+    for peak memory, so tracing does not distort the timings. The bulk
+    `schedule_calls` path is run once per size, each time with `missing_fraction` of
+    `size` new start model instances that do not have a call.
+
+    Paths: start model save, stop model save, log entry save (`update_call_from_log`),
+    the `schedule_calls` command in bulk mode, the Call admin changelist and the
+    `CallSubjectCreateView`.
+
+    For example:
+
+        benchmark = CallManagerBenchmark(model_caller, sizes=[10000, 100000])
+        results = benchmark.run()
+    """
+
+    sizes = [10000, 100000, 1000000]
+    number = 20
+    missing_fraction = 0.1
+    seed_batch_size = 5000
+    subject_prefix = 'BENCH'
+
+    def __init__(self, model_caller, sizes=None, number=None, using=None, stdout=None):
+        self.model_caller = model_caller
+        self.sizes = sizes or self.sizes
+        self.number = number or self.number
+        self.using = using or 'default'
+        self.stdout = stdout
+
+    def run(self):
+        """Returns a dictionary of environment details and a list of results, one per
+        size and path."""
+        results = []
+        for size in self.sizes:
+            self.write(f'Seeding {size} calls ...')
+            with transaction.atomic(using=self.using):
+                calls = self.seed(size)
+                for path, func, number, prepare in self.paths(calls, size):
+                    result = self.measure(path, func, number, prepare)
+                    result.update(size=size)
+                    results.append(result)
+                    self.write(
+                        f'  {path}: {result["per_op_ms"]:.2f} ms/op, '
+                        f'{result["queries_per_op"]:.1f} queries/op, {result["peak_kb"]:.0f} KB peak')
+                transaction.set_rollback(True, using=self.using)
+        return dict(environment=self.environment(), results=results)
+
+    def subject_identifier(self, index):
+        return f'{self.subject_prefix}{index:07d}'
+
+    def seed(self, size):
+        """Seeds calls, logs and start model instances and returns a sample of calls
+        that are not closed.
+
+        Call status is spread across new, open and closed. post_save is not sent by
+        `bulk_create` so no calls are scheduled while seeding."""
+        call_statuses = [NEW_CALL, OPEN_CALL, CLOSED]
+        today = date.today()
+        model_caller = self.model_caller
+        sample = []
+        for indexes in chunked(range(size), self.seed_batch_size):
+            calls = model_caller.call_model.objects.bulk_create([
+                model_caller.call_model(
+                    subject_identifier=self.subject_identifier(index),
+                    label=model_caller.label,
+                    scheduled=today - timedelta(days=index % 365),
+                    call_status=call_statuses[index % len(call_statuses)])
+                for index in indexes])
+            if calls and calls[0].pk is None:
+                calls = list(model_caller.call_model.objects.filter(
+                    subject_identifier__in=[self.subject_identifier(index) for index in indexes],
+                    label=model_caller.label))
+            model_caller.log_model.objects.bulk_create(
+                [model_caller.log_model(call=call) for call in calls])
+            model_caller.start_model.objects.bulk_create([
+                model_caller.start_model(subject_identifier=self.subject_identifier(index))
+                for index in indexes])
+            if len(sample) < (self.number + 1) * 2:
+                sample.extend(call for call in calls if call.call_status != CLOSED)
+        return sample[:(self.number + 1) * 2]
+
+    def seed_missing(self, size):
+        """Seeds start model instances without a call for `schedule_calls`."""
+        prefix = f'{self.subject_prefix}M{next(self.missing_batches)}'
+        for indexes in chunked(range(max(1, int(size * self.missing_fraction))), self.seed_batch_size):
+            self.model_caller.start_model.objects.bulk_create([
+                self.model_caller.start_model(subject_identifier=f'{prefix}{index:07d}')
+                for index in indexes])
+
+    def paths(self, calls, size):
+        """Returns a list of (path, func, number, prepare) to measure against the sample
+        calls. `prepare`, if not None, is run before each pass and is not measured.
+
+        The stop model path closes the first half of the sample; the log entry and
+        view paths use the logs of the other half. Each path needs `number` + 1
+        inputs, one for the memory pass."""
+        model_caller = self.model_caller
+        user = get_user_model().objects.create_superuser(
+            f'{self.subject_prefix.lower()}user', 'bench@example.com', 'pass')
+        stop_calls, log_calls = calls[:len(calls) // 2], calls[len(calls) // 2:]
+        logs = list(model_caller.log_model.objects.filter(call__in=log_calls))
+        new_subjects = count()
+        stop_subjects = iter(call.subject_identifier for call in stop_calls)
+        log_entry_logs = iter(logs)
+        view_logs = iter(logs)
+        self.missing_batches = count()
+
+        def start_model_save():
+            model_caller.start_model.objects.create(
+                subject_identifier=f'{self.subject_prefix}N{next(new_subjects):07d}')
+
+        def stop_model_save():
+            model_caller.stop_model.objects.create(subject_identifier=next(stop_subjects))
+
+        def log_entry_save():
+            model_caller.log_entry_model.objects.create(
+                log=next(log_entry_logs),
+                call_datetime=get_utcnow(),
+                contact_type='no_contact',
+                survival_status=ALIVE)
+
+        def schedule_calls():
+            call_command(
+                'schedule_calls', model_caller.start_model._meta.label_lower, '--bulk',
+                stdout=StringIO())
+
+        def admin_changelist():
+            from .admin_site import edc_call_manager_admin
+            request = RequestFactory().get('/')
+            request.user = user
+            edc_call_manager_admin._registry[model_caller.call_model].changelist_view(request).render()
+
+        def call_subject_view():
+            from .views import CallSubjectCreateView
+            log = next(view_logs)
+            request = RequestFactory().get('/')
+            request.user = user
+            CallSubjectCreateView.as_view()(
+                request, log_pk=log.pk, caller_label=model_caller.label).render()
+
+        paths = [
+            ('start_model_save', start_model_save, self.number, None),
+            ('stop_model_save', stop_model_save, len(stop_calls) - 1, None),
+            ('log_entry_save', log_entry_save, len(logs) - 1, None),
+            ('schedule_calls', schedule_calls, 1, lambda: self.seed_missing(size)),
+            ('admin_changelist', admin_changelist, self.number, None),
+            ('call_subject_view', call_subject_view, len(logs) - 1, None)]
+        if not model_caller.stop_model:
+            paths = [path for path in paths if path[0] != 'stop_model_save']
+        return paths
+
+    def measure(self, path, func, number, prepare=None):
+        """Returns a dictionary of wall time and query count for `number` runs of `func`
+        and of peak memory for one more run, traced separately."""
+        if prepare:
+            prepare()
+        with CaptureQueriesContext(connections[self.using]) as context:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            seconds = time.perf_counter() - start
+        if prepare:
+            prepare()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        number = number or 1
+        return dict(
+            path=path,
+            number=number,
+            seconds=seconds,
+            per_op_ms=seconds / number * 1000,
+            queries=len(context.captured_queries),
+            queries_per_op=len(context.captured_queries) / number,
+            peak_kb=peak / 1024)
+
+    def environment(self):
+        return dict(
+            timestamp=get_utcnow().isoformat(),
+            python=platform.python_version(),
+            django=django.get_version(),
+            vendor=connections[self.using].vendor,
+            model_caller=self.model_caller.label,
+            number=self.number)
+
+    def write(self, msg):
+        if self.stdout:
+            self.stdout.write(msg)
+
+
+def compare_benchmarks(baseline, current):
+    """Returns a list of (size, path, baseline per_op_ms, current per_op_ms, ratio,
+    baseline queries_per_op, current queries_per_op) for results in both runs."""
+    baseline_results = {(result['size'], result['path']): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        other = baseline_results.get((result['size'], result['path']))
+        if other:
+            rows.append((
+                result['size'], result['path'], other['per_op_ms'], result['per_op_ms'],
+                result['per_op_ms'] / other['per_op_ms'] if other['per_op_ms'] else None,
+                other['queries_per_op'], result['queries_per_op']))
+    return rows
@@ -0,0 +1,171 @@
+import time
+
+from datetime import date
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from edc_constants.constants import CLOSED
+
+from .call_summary import calls_created
+from .exceptions import ModelCallerError
+from .utils import get_locator_digest
+
+
+class BulkCallScheduler:
+    """A class that schedules calls for many subjects at once for a model caller.
+
+    Subjects without a call are found with one anti-join against the call model. Personal
+    details and locators are resolved per chunk and the Call and Log instances are written
+    with `bulk_create`, one transaction per chunk.
+
+    `create_calls` leaves out subjects that already have an open call for the model
+    caller, or a call on the same date, so creating the calls of a chunk again, e.g.
+    by a scheduler job run twice, does not create duplicates.
+
+    For example:
+
+        scheduler = BulkCallScheduler(model_caller, chunk_size=1000, stdout=self.stdout)
+        scheduler.schedule_missing()
+    """
+
+    chunk_size = 1000
+
+    def __init__(self, model_caller, chunk_size=None, stdout=None):
+        self.model_caller = model_caller
+        self.chunk_size = chunk_size or self.chunk_size
+        self.stdout = stdout
+        self.created = 0
+        self.skipped = 0
+        self.already_scheduled = 0
+        self.not_consented = []  # subject identifiers skipped for want of a consent
+
+    def missing_subjects(self, model=None):
+        """Returns a list of (subject_identifier, scheduled) for subjects on the start
+        model that do not yet have a call for this model caller."""
+        model = model or self.model_caller.start_model
+        try:
+            model._meta.get_field('subject_identifier')
+        except FieldDoesNotExist:
+            raise ModelCallerError(
+                'Bulk scheduling requires field \'subject_identifier\' on model \'{}\'.'.format(
+                    model._meta.label_lower))
+        fields = ['subject_identifier']
+        try:
+            model._meta.get_field('initial_call_date')
+        except FieldDoesNotExist:
+            pass
+        else:
+            fields.append('initial_call_date')
+        calls = self.model_caller.call_model.objects.filter(
+            subject_identifier=OuterRef('subject_identifier'),
+            label=self.model_caller.label)
+        rows = {}
+        for row in model.objects.filter(~Exists(calls)).order_by().values_list(*fields):
+            rows.setdefault(row[0], row[1] if len(row) > 1 else None)
+        return list(rows.items())
+
+    def schedule_missing(self, model=None):
+        """Schedules a call for each subject on the start model without a call and
+        returns the number of calls created."""
+        rows = self.missing_subjects(model)
+        total = len(rows)
+        self.write(f'Found {total} subjects without a \'{self.model_caller.label}\' call.')
+        start = time.perf_counter()
+        for index in range(0, total, self.chunk_size):
+            self.create_calls(rows[index:index + self.chunk_size])
+            elapsed = time.perf_counter() - start
+            done = min(index + self.chunk_size, total)
+            rate = done / elapsed if elapsed else done
+            self.write(f'  {done}/{total} processed, {self.created} calls created ({rate:.0f} rows/s)')
+        if self.skipped:
+            self.write(f'Skipped {self.skipped} subjects without a consent.')
+        if self.already_scheduled:
+            self.write(f'Skipped {self.already_scheduled} subjects already scheduled.')
+        return self.created
+
+    def create_calls(self, rows):
+        """Creates Call and Log instances in one transaction for a chunk of
+        (subject_identifier, scheduled) rows and returns the calls created.
+
+        Rows of subjects with an open call, or a call on the same date, are skipped, as
+        are subjects without a consent if the model caller requires one. The latter are
+        added to `not_consented`."""
+        model_caller = self.model_caller
+        scheduled_field = model_caller.call_model._meta.get_field('scheduled')
+        rows = self.unscheduled(
+            [(subject_identifier, scheduled_field.to_python(scheduled or date.today()))
+             for subject_identifier, scheduled in rows])
+        identifiers = [subject_identifier for subject_identifier, _ in rows]
+        personal_details = model_caller.personal_details(identifiers)
+        locators = model_caller.get_locators(identifiers)
+        calls = []
+        for subject_identifier, scheduled in rows:
+            options = personal_details.get(subject_identifier)
+            if options is None:
+                self.skipped += 1
+                self.not_consented.append(subject_identifier)
+                continue
+            calls.append(model_caller.call_model(
+                scheduled=scheduled,
+                label=model_caller.label,
+                repeats=model_caller.repeats,
+                **options))
+        if calls:
+            with transaction.atomic():
+                model_caller.call_model.objects.bulk_create(calls)
+                self.update_pks(calls)
+                calls_created(calls)
+                model_caller.log_model.objects.bulk_create([
+                    model_caller.log_model(
+                        call=call,
+                        locator_information=locators.get(call.subject_identifier),
+                        locator_digest=get_locator_digest(locators.get(call.subject_identifier)))
+                    for call in calls])
+        self.created += len(calls)
+        return calls
+
+    def unscheduled(self, rows):
+        """Returns the rows, one per subject, of subjects without an open call for the
+        model caller or a call on the row's date, found with one query."""
+        first_rows = {}
+        for subject_identifier, scheduled in rows:
+            first_rows.setdefault(subject_identifier, scheduled)
+        if not first_rows:
+            return []
+        existing = self.model_caller.call_model.objects.filter(
+            ~Q(call_status=CLOSED) | Q(scheduled__in=set(first_rows.values())),
+            label=self.model_caller.label,
+            subject_identifier__in=list(first_rows)).values_list('subject_identifier', 'call_status', 'scheduled')
+        open_calls = set()
+        closed_calls = set()
+        for subject_identifier, call_status, scheduled in existing:
+            if call_status == CLOSED:
+                closed_calls.add((subject_identifier, scheduled))
+            else:
+                open_calls.add(subject_identifier)
+        unscheduled = [
+            (subject_identifier, scheduled) for subject_identifier, scheduled in first_rows.items()
+            if subject_identifier not in open_calls and (subject_identifier, scheduled) not in closed_calls]
+        self.already_scheduled += len(rows) - len(unscheduled)
+        return unscheduled
+
+    def update_pks(self, calls):
+        """Sets the pk on calls if the database backend did not return them."""
+        missing = {(call.subject_identifier, call.scheduled): call for call in calls if call.pk is None}
+        if missing:
+            call_model = self.model_caller.call_model
+            pks = call_model.objects.filter(
+                label=self.model_caller.label,
+                subject_identifier__in=[key[0] for key in missing]).values_list(
+                    'subject_identifier', 'scheduled', 'pk')
+            for subject_identifier, scheduled, pk in pks:
+                try:
+                    missing[(subject_identifier, scheduled)].pk = pk
+                except KeyError:
+                    pass
+
+    def write(self, msg):
+        if self.stdout:
+            self.stdout.write(msg)
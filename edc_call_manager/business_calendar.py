@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import numpy as np
+
+from django.utils import timezone
+
+from .constants import DAILY, WEEKLY, MONTHLY, QUARTELY, YEARLY
+
+
+class BusinessCalendar:
+    """A calendar of business days used to compute the next scheduled date of a call.
+
+    The next date is the reference date plus the interval, rolled forward to the next
+    business day. Dates are computed as arrays with the numpy business day functions
+    so many reference dates can be rolled forward at once.
+
+    weekmask: seven characters, Monday first, as for `numpy.busday_offset`.
+        Default: '1111100', Monday to Friday.
+    holidays: a list of dates that are not business days.
+    """
+
+    weekmask = '1111100'
+    interval_days = {DAILY: 1, WEEKLY: 7}
+    interval_months = {MONTHLY: 1, QUARTELY: 3, YEARLY: 12}
+
+    def __init__(self, weekmask=None, holidays=None):
+        self.busdaycalendar = np.busdaycalendar(
+            weekmask=weekmask or self.weekmask,
+            holidays=[np.datetime64(self.to_date(holiday), 'D') for holiday in holidays or []])
+
+    def next_date(self, reference_date, interval):
+        """Returns the next scheduled date or None for a single reference date."""
+        return self.next_dates([reference_date], interval)[0]
+
+    def next_dates(self, reference_dates, interval):
+        """Returns a list of the next scheduled dates for a list of reference dates.
+
+        Returns a list of None if the interval is not one of DAILY, WEEKLY, MONTHLY,
+        QUARTELY or YEARLY."""
+        reference_dates = self.to_array(reference_dates)
+        if interval in self.interval_days:
+            next_dates = reference_dates + np.timedelta64(self.interval_days[interval], 'D')
+        elif interval in self.interval_months:
+            next_dates = self.add_months(reference_dates, self.interval_months[interval])
+        else:
+            return [None] * len(reference_dates)
+        return self.roll_forward(next_dates).astype(object).tolist()
+
+    def roll_forward(self, dates):
+        """Returns the array of dates with any date that is not a business day moved to
+        the next business day."""
+        return np.busday_offset(dates, 0, roll='forward', busdaycal=self.busdaycalendar)
+
+    def is_business_day(self, dates):
+        return np.is_busday(self.to_array(dates), busdaycal=self.busdaycalendar).tolist()
+
+    @staticmethod
+    def add_months(dates, months):
+        """Returns the array of dates moved on by a number of months, keeping the day
+        of the month or using the last day of a shorter month."""
+        first_of_month = dates.astype('datetime64[M]')
+        day_offset = dates - first_of_month.astype('datetime64[D]')
+        target_month = first_of_month + np.timedelta64(months, 'M')
+        month_length = (target_month + np.timedelta64(1, 'M')).astype('datetime64[D]') - \
+            target_month.astype('datetime64[D]')
+        return target_month.astype('datetime64[D]') + np.minimum(day_offset, month_length - np.timedelta64(1, 'D'))
+
+    def to_array(self, dates):
+        return np.array([self.to_date(value) for value in dates], dtype='datetime64[D]')
+
+    @staticmethod
+    def to_date(value):
+        """Returns a date for a date or datetime, converting an aware datetime to
+        the current timezone first."""
+        if isinstance(value, datetime):
+            if timezone.is_aware(value):
+                value = timezone.localtime(value)
+            value = value.date()
+        return value
@@ -0,0 +1,176 @@
+import random
+
+from datetime import date
+
+from django.apps import apps as django_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from edc_base.utils import get_utcnow
+from edc_constants.constants import CLOSED
+
+from .constants import NEW_CALL, OPEN_CALL
+
+SUMMARY_SHARDS = 8
+
+
+def get_summary_model():
+    return django_apps.get_model('edc_call_manager', 'callsummary')
+
+
+def get_summary_key(label, call_status, scheduled):
+    """Returns the CallSummary key for a call. Closed calls are counted without a date,
+    so the number of rows does not grow with every date ever scheduled."""
+    return (label, call_status, None if call_status == CLOSED else scheduled)
+
+
+def update_call_summary(deltas, using=None):
+    """Adds each delta to a CallSummary count for its (label, call_status, scheduled).
+
+    deltas: a dictionary of count deltas by (label, call_status, scheduled).
+
+    Each delta goes to one of SUMMARY_SHARDS rows for the key, picked at random, so
+    concurrent updates of the same key, e.g. calls scheduled today, seldom wait on
+    the same row. Counts are read as the sum of the shards."""
+    summary_model = get_summary_model()
+    manager = summary_model.objects.db_manager(using)
+    summary_deltas = {}
+    for key, delta in deltas.items():
+        key = get_summary_key(*key)
+        summary_deltas[key] = summary_deltas.get(key, 0) + delta
+    shard = random.randrange(SUMMARY_SHARDS)
+    for (label, call_status, scheduled), delta in sorted(summary_deltas.items(), key=lambda item: str(item[0])):
+        if not delta:
+            continue
+        options = dict(label=label, call_status=call_status, scheduled=scheduled, shard=shard)
+        if not manager.filter(**options).update(count=F('count') + delta):
+            try:
+                with transaction.atomic(using=manager.db):
+                    manager.create(count=delta, **options)
+            except IntegrityError:
+                manager.filter(**options).update(count=F('count') + delta)
+
+
+def call_saving(instance, raw, using=None):
+    """Loads the key of a call about to be saved from the database if it was not
+    loaded with the instance, e.g. a deserialized call or a call loaded with
+    label, call_status or scheduled deferred. See CallModelMixin.from_db."""
+    if getattr(instance, 'call_summary_key', None) or instance.pk is None:
+        return
+    if raw or not instance._state.adding:
+        instance.call_summary_key = instance.__class__._base_manager.using(using).filter(
+            pk=instance.pk).values_list('label', 'call_status', 'scheduled').first()
+
+
+def call_saved(instance, created, using=None):
+    """Updates CallSummary for a call instance that was just saved.
+
+    The previous key is the one loaded from the database, see CallModelMixin.from_db
+    and `call_saving`."""
+    key = (instance.label, instance.call_status, instance.scheduled)
+    previous = None if created else getattr(instance, 'call_summary_key', None)
+    if created or previous:
+        deltas = {key: 1}
+        if previous:
+            deltas[previous] = deltas.get(previous, 0) - 1
+        update_call_summary(deltas, using=using)
+    instance.call_summary_key = key
+
+
+def call_deleted(instance, using=None):
+    key = getattr(instance, 'call_summary_key', None)
+    if key:
+        update_call_summary({key: -1}, using=using)
+
+
+def calls_created(calls, using=None):
+    """Updates CallSummary for calls created with `bulk_create`."""
+    deltas = {}
+    for call in calls:
+        key = (call.label, call.call_status, call.scheduled)
+        deltas[key] = deltas.get(key, 0) + 1
+        call.call_summary_key = key
+    update_call_summary(deltas, using=using)
+
+
+def close_calls(queryset):
+    """Closes the calls in the queryset that are not closed, updates CallSummary and
+    returns a dictionary of the number of calls closed by label.
+
+    Calls are counted by label, call_status and scheduled before the UPDATE in
+    the same transaction."""
+    closed = {}
+    deltas = {}
+    with transaction.atomic(using=queryset.db):
+        queryset = queryset.exclude(call_status=CLOSED)
+        counts = queryset.order_by().values('label', 'call_status', 'scheduled').annotate(count=Count('pk'))
+        for row in counts:
+            closed[row['label']] = closed.get(row['label'], 0) + row['count']
+            key = (row['label'], row['call_status'], row['scheduled'])
+            closed_key = (row['label'], CLOSED, row['scheduled'])
+            deltas[key] = deltas.get(key, 0) - row['count']
+            deltas[closed_key] = deltas.get(closed_key, 0) + row['count']
+        if closed:
+            queryset.update(call_status=CLOSED, auto_closed=True, modified=get_utcnow())
+            update_call_summary(deltas, using=queryset.db)
+    return closed
+
+
+def get_call_figures(labels=None, today=None):
+    """Returns a dictionary of new, open, closed, due today and overdue call counts by
+    label from CallSummary.
+
+    Due today and overdue count calls that are not closed and scheduled for today
+    or before today."""
+    today = today or date.today()
+    queryset = get_summary_model().objects.all()
+    if labels is not None:
+        queryset = queryset.filter(label__in=labels)
+    not_closed = ~Q(call_status=CLOSED)
+    rows = queryset.order_by().values('label').annotate(
+        new=Sum('count', filter=Q(call_status=NEW_CALL)),
+        open=Sum('count', filter=Q(call_status=OPEN_CALL)),
+        closed=Sum('count', filter=Q(call_status=CLOSED)),
+        due_today=Sum('count', filter=not_closed & Q(scheduled=today)),
+        overdue=Sum('count', filter=not_closed & Q(scheduled__lt=today)))
+    figures = {}
+    for row in rows:
+        label = row.pop('label')
+        figures[label] = {name: value or 0 for name, value in row.items()}
+    return figures
+
+
+def reconcile_call_summary(call_models=None, using=None):
+    """Recounts the call models and corrects CallSummary keys that have drifted.
+
+    Rows of keys without calls are deleted. Returns the number of keys corrected."""
+    summary_model = get_summary_model()
+    call_models = call_models or [django_apps.get_model('edc_call_manager', 'call')]
+    corrected = 0
+    with transaction.atomic(using=using):
+        # lock the summary rows first so incremental updates wait for the recount.
+        summaries = {}
+        for summary in summary_model.objects.using(using).select_for_update().order_by('shard'):
+            summaries.setdefault((summary.label, summary.call_status, summary.scheduled), []).append(summary)
+        actual = {}
+        for call_model in call_models:
+            counts = call_model.objects.using(using).order_by().values(
+                'label', 'call_status', 'scheduled').annotate(count=Count('pk'))
+            for row in counts:
+                key = get_summary_key(row['label'], row['call_status'], row['scheduled'])
+                actual[key] = actual.get(key, 0) + row['count']
+        for key, shards in summaries.items():
+            total = sum(summary.count for summary in shards)
+            if key not in actual:
+                summary_model.objects.using(using).filter(pk__in=[summary.pk for summary in shards]).delete()
+                corrected += 1 if total else 0
+            elif total != actual[key]:
+                summary = shards[0]
+                summary.count += actual[key] - total
+                summary.save(update_fields=['count', 'modified'])
+                corrected += 1
+        missing = [summary_model(label=key[0], call_status=key[1], scheduled=key[2], count=count)
+                   for key, count in actual.items() if key not in summaries]
+        summary_model.objects.using(using).bulk_create(missing)
+        corrected += len(missing)
+    return corrected
@@ -1,13 +1,21 @@
-import copy
+import json
 import sys
+import threading
+import time
+
+from types import MappingProxyType
 
 from django.apps import apps as django_apps
 from django.core.management.color import color_style
 from django.utils.module_loading import import_module
 from django.utils.module_loading import module_has_submodule
 
+from .call_summary import close_calls
 from .exceptions import ModelCallerError
 from .constants import style
+from .scheduler_jobs import enqueue_rollover, enqueue_schedule, enqueue_unschedule
+from .scheduling_queue import scheduling_queue
+from .utils import chunked
 
 
 class AlreadyRegistered(Exception):
@@ -18,25 +26,36 @@ class CallerSite:
 
     def __init__(self):
         self._registry = {}
+        self._lookup = MappingProxyType({})
+        self._connected_signals = []
+        self._registry_json = None
+        self._pending_autodiscover = None
+        self._autodiscover_lock = threading.RLock()
+        self._autodiscovering = False
+        self.autodiscover_times = {}
+        self.verbose = False
         self.reset_registry()
         self.style = color_style()
 
     @property
     def start_models(self):
         """Return a dictionary of models used to schedule or 'start" a call or sequence of calls."""
+        self.ensure_discovered()
         return self._registry['start_models']
 
     @property
     def stop_models(self):
         """Return a dictionary of models used to 'close' a call or 'stop' a sequence of calls."""
+        self.ensure_discovered()
         return self._registry['stop_models']
 
     @property
     def model_callers(self):
+        self.ensure_discovered()
         return self._registry['model_callers']
 
     def register(self, caller_class, start_model, stop_model=None, verbose=None):
-        verbose = True if verbose is None else verbose
+        verbose = self.verbose if verbose is None else verbose
         if start_model not in self.start_models:
             if verbose:
                 sys.stdout.write(
@@ -45,8 +64,10 @@ class CallerSite:
             # self.verify_model(model, caller)
             self.start_models.update({start_model: caller})
             self.model_callers.update({caller.label: caller})
+            self.update_lookup()
+            self.connect_signals(caller)
             if stop_model:
-                if stop_model in self.stop_models:
+                if stop_model in self.stop_models and verbose:
                     sys.stdout.write(style.NOTICE(
                         '   Warning: more than one model caller uses model '
                         '\'{}\' to unschedule calls.\n'.format(stop_model._meta.label_lower)))
@@ -62,6 +83,7 @@ class CallerSite:
         """ Unregister this model caller and it's start and stop models."""
         # TODO: this does not completely reset
         del self._registry['start_models'][model]
+        self.update_lookup()
 
     def verify_model(self, model, caller):
         """Confirm model has required FK."""
@@ -85,36 +107,92 @@ class CallerSite:
                         caller.unscheduling_model, caller.call_model_fk, str(e)))
 
     def reset_registry(self):
+        if self._connected_signals:
+            from .signals import disconnect_signals
+            disconnect_signals(self._connected_signals)
+            self._connected_signals = []
         self._registry = dict(
             start_models={}, stop_models={}, model_callers={})
+        self.update_lookup()
 
-    def get_model_caller(self, param):
-        """Find and return a model caller class.
+    def update_lookup(self):
+        """Rebuilds the read-only table used by `get_model_caller`.
 
-        param: either a "start" model class or model_caller label."""
+        Maps each start model class, its 'app_label.model_name' and 'app_label.ModelName'
+        strings and (app_label, model_name) tuple, and each model caller label, to the
+        model caller. Start models take precedence over labels."""
+        lookup = {}
+        for label, model_caller in self.model_callers.items():
+            lookup[label.lower()] = model_caller
+        for start_model, model_caller in self.start_models.items():
+            lookup[start_model] = model_caller
+            lookup[start_model._meta.label_lower] = model_caller
+            lookup[(start_model._meta.app_label, start_model._meta.model_name)] = model_caller
+        self._lookup = MappingProxyType(lookup)
+        self._registry_json = None
 
-        try:
-            model = django_apps.get_model(*param)
-        except (LookupError, TypeError, AttributeError):
-            model = param
-        try:
-            model_caller = self.start_models[model]
-        except KeyError:
-            model_caller = None
-        if not model_caller:
-            try:
-                model_caller = self.model_callers[param]
-            except KeyError:
-                model_caller = None
-        return model_caller
+    @property
+    def registry_json(self):
+        """Returns the model callers as a JSON string of their labels, models and
+        repeat settings.
+
+        Computed on first use and again only after the registry changes."""
+        self.ensure_discovered()
+        if self._registry_json is None:
+            self._registry_json = json.dumps(dict(model_callers=[
+                dict(label=model_caller.label,
+                     verbose_name=model_caller.verbose_name,
+                     start_model=model_caller.start_model._meta.label_lower,
+                     stop_model=model_caller.stop_model._meta.label_lower if model_caller.stop_model else None,
+                     call_model=model_caller.call_model._meta.label_lower,
+                     subject_model=model_caller.subject_model._meta.label_lower,
+                     consent_model=model_caller.consent_model._meta.label_lower if model_caller.consent_model else None,
+                     locator_model=model_caller.locator_model._meta.label_lower,
+                     repeat_times=model_caller.repeat_times,
+                     interval=model_caller.interval)
+                for model_caller in self.model_callers.values()]))
+        return self._registry_json
+
+    def connect_signals(self, caller):
+        """Connects the post_save receivers for the models used by this model caller."""
+        from .signals import connect_model_caller_signals
+        self._connected_signals.extend(connect_model_caller_signals(caller))
+
+    def restore_signals(self, connected):
+        """Disconnects the receivers connected since `connected`, a copy of an earlier
+        `_connected_signals`, other than those in it."""
+        from .signals import disconnect_signals
+        disconnect_signals([receiver for receiver in self._connected_signals if receiver not in connected])
+        self._connected_signals = connected
+
+    def get_model_caller(self, param):
+        """Find and return a model caller class or None.
+
+        param: either a "start" model class, an 'app_label.model_name' string or
+        (app_label, model_name) tuple for a "start" model, or a model_caller label."""
+        self.ensure_discovered()
+        if isinstance(param, str):
+            param = param.lower()
+        elif isinstance(param, (tuple, list)):
+            param = tuple(str(value).lower() for value in param)
+        return self._lookup.get(param)
 
     def schedule_calls(self, model, instance):
-        """Schedule a call, e.g. create a Call instance, if the model is registered as a start model."""
+        """Schedule a call, e.g. create a Call instance, if the model is registered as a start model.
+
+        If the model caller enqueues jobs, a schedule job is added for `run_call_scheduler`. If the
+        model caller defers scheduling, the call is queued until the transaction commits."""
         try:
             model_caller = self.start_models[model]
-            model_caller.schedule_call(instance)
         except KeyError:
             pass
+        else:
+            if model_caller.enqueue_jobs:
+                enqueue_schedule(model_caller, instance)
+            elif model_caller.defer_scheduling:
+                scheduling_queue.schedule(model_caller, instance, using=instance._state.db)
+            else:
+                model_caller.schedule_call(instance)
 
     def unschedule_calls(self, model, instance):
         """Unschedule a call(s) if model is a stop model."""
@@ -123,16 +201,50 @@ class CallerSite:
             for start_model in start_models:
                 try:
                     model_caller = self.start_models[start_model]
-                    model_caller.unschedule_call(instance.subject_identifier)
                 except KeyError:
                     pass
+                else:
+                    if model_caller.enqueue_jobs:
+                        enqueue_unschedule(model_caller, instance.subject_identifier)
+                    elif model_caller.defer_scheduling:
+                        scheduling_queue.unschedule(
+                            model_caller, instance.subject_identifier, using=instance._state.db)
+                    else:
+                        model_caller.unschedule_call(instance.subject_identifier)
         except KeyError:
             pass
 
+    def bulk_unschedule_calls(self, stop_model, objs, chunk_size=None):
+        """Unschedules calls for many stop model instances or subject identifiers and
+        returns a dictionary of the number of calls closed by model caller label.
+
+        Model callers sharing a call model are unscheduled together with one UPDATE
+        per chunk of subject identifiers."""
+        subject_identifiers = sorted({getattr(obj, 'subject_identifier', obj) for obj in objs})
+        model_callers = [
+            self.start_models[start_model] for start_model in self.stop_models.get(stop_model, [])
+            if start_model in self.start_models]
+        closed = {model_caller.label: 0 for model_caller in model_callers}
+        labels_by_call_model = {}
+        for model_caller in model_callers:
+            labels_by_call_model.setdefault(model_caller.call_model, []).append(model_caller.label)
+            chunk_size = chunk_size or model_caller.lookup_chunk_size
+        for call_model, labels in labels_by_call_model.items():
+            for chunk in chunked(subject_identifiers, chunk_size):
+                counts = close_calls(call_model.objects.filter(
+                    subject_identifier__in=chunk,
+                    label__in=labels))
+                for label, count in counts.items():
+                    closed[label] += count
+        return closed
+
     def schedule_next_call(self, call):
         try:
             model_caller = self._registry['model_callers'].get(call.label)
-            model_caller.schedule_next_call(call)
+            if model_caller.enqueue_jobs:
+                enqueue_rollover(model_caller, call)
+            else:
+                model_caller.schedule_next_call(call)
         except AttributeError as e:
             if 'object has no attribute \'label\'' not in str(e):
                 raise AttributeError(e)
@@ -142,22 +254,80 @@ class CallerSite:
         model_caller.update_call_from_log(call, log_entry)
 
     def autodiscover(self, module_name=None):
-        """ Autodiscover rules from a model_callers module."""
+        """ Autodiscover rules from a model_callers module.
+
+        Only apps with the module are imported. The import time and number of model
+        callers registered are kept per app in `autodiscover_times`."""
         module_name = module_name or 'model_callers'
-        sys.stdout.write(' * checking for site {} ...\n'.format(module_name))
-        for app in django_apps.app_configs:
+        if self.verbose:
+            sys.stdout.write(' * checking for site {} ...\n'.format(module_name))
+        for app_config in django_apps.get_app_configs():
+            if not module_has_submodule(app_config.module, module_name):
+                continue
+            # `register` appends to the stop model lists, so these are copied too.
+            before_import_registry = dict(
+                start_models=dict(self.start_models),
+                stop_models={model: list(start_models) for model, start_models in self.stop_models.items()},
+                model_callers=dict(self.model_callers))
+            before_import_signals = list(self._connected_signals)
+            start = time.perf_counter()
             try:
-                mod = import_module(app)
+                import_module('{}.{}'.format(app_config.name, module_name))
+            except Exception:
+                self._registry = before_import_registry
+                self.update_lookup()
+                self.restore_signals(before_import_signals)
+                raise
+            finally:
+                self.autodiscover_times[app_config.name] = dict(
+                    seconds=time.perf_counter() - start,
+                    model_callers=len(self._registry['model_callers']) - len(
+                        before_import_registry['model_callers']))
+        self._pending_autodiscover = None
+
+    def autodiscover_lazily(self, module_name=None):
+        """Defers `autodiscover` until the registry is first used.
+
+        The registry is first used by a lookup, by a management command or view, or by
+        the first model save or request, whichever comes first. Until then no
+        model_callers modules are imported."""
+        from django.core.signals import request_started
+        from django.db.models.signals import pre_save
+        self._pending_autodiscover = module_name or 'model_callers'
+        pre_save.connect(self.autodiscover_on_signal, weak=False, dispatch_uid='edc_call_manager_autodiscover')
+        request_started.connect(
+            self.autodiscover_on_signal, weak=False, dispatch_uid='edc_call_manager_autodiscover')
+
+    def autodiscover_on_signal(self, sender, **kwargs):
+        self.ensure_discovered()
+
+    def ensure_discovered(self):
+        """Runs a deferred autodiscover, once. See `autodiscover_lazily`.
+
+        Other threads wait until discovery is complete, so none sees a partial
+        registry. Lookups made by the model_callers modules being imported return
+        without waiting."""
+        if self._pending_autodiscover:
+            with self._autodiscover_lock:
+                if not self._pending_autodiscover or self._autodiscovering:
+                    return
+                self._autodiscovering = True
                 try:
-                    before_import_registry = copy.copy(
-                        site_model_callers._registry)
-                    import_module('{}.{}'.format(app, module_name))
-                except Exception:
-                    site_model_callers._registry = before_import_registry
-                    if module_has_submodule(mod, module_name):
-                        raise
-            except ImportError:
-                pass
+                    self.autodiscover(self._pending_autodiscover)
+                finally:
+                    self._autodiscovering = False
+                from django.core.signals import request_started
+                from django.db.models.signals import pre_save
+                pre_save.disconnect(dispatch_uid='edc_call_manager_autodiscover')
+                request_started.disconnect(dispatch_uid='edc_call_manager_autodiscover')
+
+    def autodiscover_report(self):
+        """Returns a list of (app name, seconds, model callers registered) for
+        each app with a model_callers module, slowest first."""
+        self.ensure_discovered()
+        return sorted(
+            [(name, times['seconds'], times['model_callers']) for name, times in self.autodiscover_times.items()],
+            key=lambda row: row[1], reverse=True)
 
 
 site_model_callers = CallerSite()
@@ -1,6 +1,8 @@
 from edc_constants.constants import YES, NO, DWTA, OTHER
 
 from .constants import NO_CONTACT, DIRECT_CONTACT, INDIRECT_CONTACT
+from .constants import ROLLOVER, SCHEDULE, UNSCHEDULE
+from .constants import DONE_JOB, FAILED_JOB, PENDING_JOB, RUNNING_JOB
 
 
 CONTACT_TYPE = (
@@ -43,3 +45,16 @@ APPT_REASONS_UNWILLING = (
     (DWTA, 'Prefer not to say why I am unwilling.'),
     (OTHER, 'Other reason ...'),
 )
+
+JOB_TYPES = (
+    (SCHEDULE, 'Schedule a call'),
+    (UNSCHEDULE, 'Unschedule calls'),
+    (ROLLOVER, 'Schedule the next call'),
+)
+
+JOB_STATUS = (
+    (PENDING_JOB, 'Pending'),
+    (RUNNING_JOB, 'Running'),
+    (DONE_JOB, 'Done'),
+    (FAILED_JOB, 'Failed'),
+)
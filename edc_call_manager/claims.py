@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from edc_base.utils import get_utcnow
+
+from edc_constants.constants import CLOSED
+
+
+class CallClaim:
+    """A class that claims the next due call with a Log for a staff member for the
+    length of a lease, so that two staff members do not work the same call.
+
+    The next unclaimed call, or call with a lapsed claim, is selected in (scheduled, id)
+    order with `SELECT ... FOR UPDATE SKIP LOCKED`, so concurrent claims each take a
+    different row instead of waiting on the same one. A staff member with a live
+    claim is given the same call again and the lease is renewed.
+
+    The claim is a plain UPDATE of claimed_by and claimed_until; `modified` is not
+    changed and no signals are sent.
+
+    For example:
+
+        call = CallClaim(request.user.username, label='antenatal-to-postnatal').claim_next()
+    """
+
+    attempts = 3
+    lease = timedelta(minutes=20)
+
+    def __init__(self, username, label=None, lease=None, call_model=None, log_model=None, today=None):
+        self.username = username
+        self.label = label
+        self.lease = lease or self.lease
+        self.call_model = call_model or django_apps.get_model('edc_call_manager', 'call')
+        self.log_model = log_model or django_apps.get_model('edc_call_manager', 'log')
+        self.today = today or date.today()
+
+    @property
+    def queryset(self):
+        """Returns a queryset of due calls with a Log."""
+        # not closed, as in the condition of the partial claim index.
+        queryset = self.call_model.objects.filter(
+            Exists(self.log_model.objects.filter(call=OuterRef('pk'))),
+            ~Q(call_status=CLOSED),
+            scheduled__lte=self.today)
+        if self.label:
+            queryset = queryset.filter(label=self.label)
+        return queryset
+
+    def claimed(self, now=None):
+        """Returns the call with a live claim by this staff member, or None."""
+        return self.queryset.filter(
+            claimed_by=self.username, claimed_until__gt=now or get_utcnow()).order_by('scheduled', 'pk').first()
+
+    def claim_next(self):
+        """Claims and returns the next due call, or None if every due call is claimed."""
+        now = get_utcnow()
+        claimed_until = now + self.lease
+        unclaimed = Q(claimed_until__isnull=True)
+        lapsed = Q(claimed_until__lte=now)
+        with transaction.atomic():
+            call = self.claimed(now)
+            if call:
+                self.call_model.objects.filter(pk=call.pk).update(claimed_until=claimed_until)
+            for _ in range(0 if call else self.attempts):
+                candidate = self.queryset.filter(unclaimed | lapsed).select_for_update(
+                    skip_locked=True).order_by('scheduled', 'pk').first()
+                if not candidate:
+                    break
+                # the claim conditions are repeated for databases without row locks.
+                if self.call_model.objects.filter(unclaimed | lapsed, pk=candidate.pk).update(
+                        claimed_by=self.username, claimed_until=claimed_until):
+                    call = candidate
+                    break
+        if call:
+            call.claimed_by = self.username
+            call.claimed_until = claimed_until
+        return call
+
+    def release(self, call):
+        """Releases this staff member's claim on a call and returns True if there was one."""
+        return bool(self.call_model.objects.filter(pk=call.pk, claimed_by=self.username).update(
+            claimed_by=None, claimed_until=None))
@@ -12,3 +12,12 @@ WEEKLY = 'w'
 YEARLY = 'y'
 NEW_CALL = 'NEW'
 OPEN_CALL = 'open'
+
+ROLLOVER = 'rollover'
+SCHEDULE = 'schedule'
+UNSCHEDULE = 'unschedule'
+
+DONE_JOB = 'done'
+FAILED_JOB = 'failed'
+PENDING_JOB = 'pending'
+RUNNING_JOB = 'running'
@@ -0,0 +1,147 @@
+import csv
+import json
+
+from datetime import date, datetime
+
+from django.apps import apps as django_apps
+from django.db.models import Exists, OuterRef
+
+CSV = 'csv'
+JSONL = 'jsonl'
+
+EXPORT_FORMATS = {CSV: 'text/csv', JSONL: 'application/x-ndjson'}
+
+
+class Echo:
+    """A file-like object for csv.writer that returns the line written."""
+
+    def write(self, value):
+        return value
+
+
+class CallExport:
+    """Exports log entries joined with their log and call as CSV or JSONL lines, and
+    the calls without a log entry.
+
+    Log entries are fetched with `select_related` and `iterator(chunk_size=...)` and
+    written one line at a time, so memory does not grow with the number of rows and
+    the first line is available once the first chunk is fetched. Calls without a
+    log entry, e.g. new calls never attempted, follow in a second pass, joined with
+    their log, with empty log entry columns. Only the `fields` columns are loaded;
+    names, initials, locator information and contact notes are not exported.
+
+    For example:
+
+        export = CallExport(label='testmodelcaller', export_format=JSONL)
+        for line in export.lines():
+            f.write(line)
+    """
+
+    chunk_size = 2000
+    fields = [
+        ('subject_identifier', 'log__call__subject_identifier'),
+        ('label', 'log__call__label'),
+        ('scheduled', 'log__call__scheduled'),
+        ('repeats', 'log__call__repeats'),
+        ('call_attempts', 'log__call__call_attempts'),
+        ('call_status', 'log__call__call_status'),
+        ('call_outcome', 'log__call__call_outcome'),
+        ('auto_closed', 'log__call__auto_closed'),
+        ('call_id', 'log__call__id'),
+        ('log_id', 'log__id'),
+        ('log_datetime', 'log__log_datetime'),
+        ('log_entry_id', 'id'),
+        ('call_reason', 'call_reason'),
+        ('call_datetime', 'call_datetime'),
+        ('contact_type', 'contact_type'),
+        ('survival_status', 'survival_status'),
+        ('time_of_week', 'time_of_week'),
+        ('time_of_day', 'time_of_day'),
+        ('appt', 'appt'),
+        ('appt_reason_unwilling', 'appt_reason_unwilling'),
+        ('appt_date', 'appt_date'),
+        ('appt_grading', 'appt_grading'),
+        ('appt_location', 'appt_location'),
+        ('delivered', 'delivered'),
+        ('may_call', 'may_call'),
+    ]
+
+    def __init__(self, label=None, export_format=None, chunk_size=None, call_model=None, log_entry_model=None):
+        self.label = label
+        self.export_format = export_format or CSV
+        if self.export_format not in EXPORT_FORMATS:
+            raise ValueError(
+                'Invalid export format. Expected one of {}. Got {}'.format(
+                    list(EXPORT_FORMATS), self.export_format))
+        self.chunk_size = chunk_size or self.chunk_size
+        self.call_model = call_model or django_apps.get_model('edc_call_manager', 'call')
+        self.log_entry_model = log_entry_model or django_apps.get_model('edc_call_manager', 'logentry')
+
+    @property
+    def content_type(self):
+        return EXPORT_FORMATS[self.export_format]
+
+    @property
+    def call_lookups(self):
+        """Returns the lookups of `fields` from Call, or None for log entry columns."""
+        lookups = {}
+        for name, lookup in self.fields:
+            if lookup.startswith('log__call__'):
+                lookups[name] = lookup[len('log__call__'):]
+            elif lookup.startswith('log__'):
+                lookups[name] = lookup
+            else:
+                lookups[name] = None
+        return lookups
+
+    @property
+    def queryset(self):
+        """Returns a queryset of log entries joined with their log and call."""
+        # the foreign keys are loaded for select_related, primary keys always.
+        only = ['log', 'log__call'] + [
+            lookup for _, lookup in self.fields if lookup != 'id' and not lookup.endswith('__id')]
+        queryset = self.log_entry_model.objects.select_related('log__call').only(*only)
+        if self.label:
+            queryset = queryset.filter(log__call__label=self.label)
+        # unordered, so the database does not sort the join before sending the first row.
+        return queryset.order_by()
+
+    @property
+    def calls_without_log_entries(self):
+        """Returns a values queryset of the calls without a log entry, left joined with their log."""
+        log_entries = self.log_entry_model.objects.filter(log__call=OuterRef('pk'))
+        queryset = self.call_model.objects.filter(~Exists(log_entries))
+        if self.label:
+            queryset = queryset.filter(label=self.label)
+        return queryset.order_by().values(*[lookup for lookup in self.call_lookups.values() if lookup])
+
+    def rows(self):
+        """Yields a dictionary per log entry, then per call without a log entry."""
+        for log_entry in self.queryset.iterator(chunk_size=self.chunk_size):
+            yield {name: self.get_value(log_entry, lookup) for name, lookup in self.fields}
+        call_lookups = self.call_lookups
+        for call in self.calls_without_log_entries.iterator(chunk_size=self.chunk_size):
+            yield {name: self.to_value(call[lookup] if lookup else None) for name, lookup in call_lookups.items()}
+
+    def get_value(self, obj, lookup):
+        for attr in lookup.split('__'):
+            obj = getattr(obj, attr)
+        return self.to_value(obj)
+
+    def to_value(self, value):
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        if value is not None and not isinstance(value, (bool, int, float, str)):
+            return str(value)
+        return value
+
+    def lines(self):
+        """Yields the export one line at a time, with a header line for CSV."""
+        if self.export_format == CSV:
+            writer = csv.writer(Echo())
+            yield writer.writerow([name for name, _ in self.fields])
+            for row in self.rows():
+                yield writer.writerow(row.values())
+        else:
+            for row in self.rows():
+                yield json.dumps(row) + '\n'
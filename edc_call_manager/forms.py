@@ -1,12 +1,10 @@
-from django.apps import apps as django_apps
 from django import forms
 
 
 from edc_constants.constants import CLOSED, OTHER, YES
 
-from .admin import edc_call_manager_admin
-
-LogEntry = django_apps.get_model('edc_call_manager.logentry')
+from .admin_site import edc_call_manager_admin
+from .models import LogEntry
 
 
 class LogEntryForm(forms.ModelForm):
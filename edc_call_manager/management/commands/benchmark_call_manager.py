@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from edc_call_manager.benchmarks import CallManagerBenchmark, compare_benchmarks
+from edc_call_manager.caller_site import site_model_callers
+
+
+class Command(BaseCommand):
+
+    help = ('Time the call manager hot paths against 10k, 100k and 1M seeded calls. '
+            'Seeded rows are rolled back. Do not run against a production database')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model_caller', type=str, nargs='?',
+            help='Model caller label or start model app_label.model_name. Default: the first registered')
+        parser.add_argument(
+            '--sizes', type=str, dest='sizes',
+            default=','.join(str(size) for size in CallManagerBenchmark.sizes),
+            help='Comma separated numbers of calls to seed. Default: 10000,100000,1000000')
+        parser.add_argument(
+            '--number', type=int, dest='number', default=CallManagerBenchmark.number,
+            help=f'Number of runs per path. Default: {CallManagerBenchmark.number}')
+        parser.add_argument(
+            '--database', type=str, dest='database', default='default',
+            help='Database alias. Default: default')
+        parser.add_argument(
+            '--output', type=str, dest='output',
+            help='Write the results as JSON to this file')
+        parser.add_argument(
+            '--compare', type=str, dest='compare',
+            help='Compare the results with those in a JSON file from an earlier run')
+
+    def handle(self, *args, **options):
+        if options['model_caller']:
+            model_caller = site_model_callers.get_model_caller(options['model_caller'])
+        else:
+            model_caller = next(iter(site_model_callers.model_callers.values()), None)
+        if not model_caller:
+            raise CommandError('Unknown model caller. Got \'{}\''.format(options['model_caller']))
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('Invalid --sizes. Got \'{}\''.format(options['sizes']))
+        benchmark = CallManagerBenchmark(
+            model_caller, sizes=sizes, number=options['number'],
+            using=options['database'], stdout=self.stdout)
+        results = benchmark.run()
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote results to {options["output"]}'))
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            for size, path, before, after, ratio, queries_before, queries_after in compare_benchmarks(
+                    baseline, results):
+                self.stdout.write(
+                    f'{size:>8} {path:<20} {before:9.2f} ms -> {after:9.2f} ms '
+                    f'({ratio or 0:.2f}x) queries {queries_before:.1f} -> {queries_after:.1f}')
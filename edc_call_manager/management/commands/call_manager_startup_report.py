@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from edc_call_manager.caller_site import site_model_callers
+from edc_call_manager.startup import import_times_by_app
+
+
+class Command(BaseCommand):
+
+    help = 'Report startup cost per app: import time during django.setup() and model caller autodiscovery'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, dest='limit', default=20,
+            help='Number of apps to list by import time. Default: 20')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Import time during django.setup() by app:')
+        rows = import_times_by_app()
+        for name, seconds in rows[:options['limit']]:
+            self.stdout.write(f'  {seconds * 1000:9.1f} ms  {name}')
+        self.stdout.write(f'  {sum(row[1] for row in rows) * 1000:9.1f} ms  total')
+        self.stdout.write('Model caller autodiscovery by app:')
+        for name, seconds, model_callers in site_model_callers.autodiscover_report():
+            self.stdout.write(f'  {seconds * 1000:9.1f} ms  {name} ({model_callers} model callers)')
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from edc_call_manager.sync_export import ChangedSinceExport
+
+
+class Command(BaseCommand):
+
+    help = 'Export calls, logs and log entries changed since the last export to a destination'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'destination', type=str, help='Name of the device or server the files are for')
+        parser.add_argument(
+            '--output-dir', type=str, dest='output_dir', default='.',
+            help='Directory for the batch files. Default: current directory')
+        parser.add_argument(
+            '--batch-size', type=int, dest='batch_size', default=ChangedSinceExport.batch_size,
+            help=f'Number of rows per file. Default: {ChangedSinceExport.batch_size}')
+        parser.add_argument(
+            '--lag', type=int, dest='lag', default=int(ChangedSinceExport.lag.total_seconds()),
+            help=('Seconds to leave rows for the next export. Must be longer than any '
+                  f'transaction writing calls. Default: {int(ChangedSinceExport.lag.total_seconds())}'))
+        parser.add_argument(
+            '--reset', action='store_true', dest='reset', default=False,
+            help='Forget the watermarks for this destination and export everything')
+
+    def handle(self, *args, **options):
+        export = ChangedSinceExport(
+            options['destination'], output_dir=options['output_dir'],
+            batch_size=options['batch_size'], lag=timedelta(seconds=options['lag']), stdout=self.stdout)
+        if options['reset']:
+            export.reset()
+        paths = export.export()
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(paths)} files for {options["destination"]}.'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from edc_call_manager.export import CallExport, EXPORT_FORMATS
+
+
+class Command(BaseCommand):
+
+    help = 'Export log entries joined with their log and call, and calls without a log entry, as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', type=str, dest='export_format', default='csv', choices=list(EXPORT_FORMATS),
+            help='Export format. Default: csv')
+        parser.add_argument(
+            '--label', type=str, dest='label',
+            help='Only export calls for this model caller label')
+        parser.add_argument(
+            '--output', type=str, dest='output',
+            help='File to write to. Default: stdout')
+        parser.add_argument(
+            '--chunk-size', type=int, dest='chunk_size', default=CallExport.chunk_size,
+            help=f'Number of rows fetched per database round trip. Default: {CallExport.chunk_size}')
+
+    def handle(self, *args, **options):
+        try:
+            export = CallExport(
+                label=options['label'], export_format=options['export_format'],
+                chunk_size=options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(e)
+        if options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                f.writelines(export.lines())
+            self.stderr.write(f'Wrote {options["output"]}')
+        else:
+            for line in export.lines():
+                self.stdout.write(line, ending='')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from edc_call_manager.sync_load import BulkLoader
+
+
+class Command(BaseCommand):
+
+    help = 'Load call, log and log entry files written by export_call_changes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='+', type=str, help='Files to load, in the order written')
+        parser.add_argument(
+            '--batch-size', type=int, dest='batch_size', default=BulkLoader.batch_size,
+            help=f'Number of rows per transaction. Default: {BulkLoader.batch_size}')
+        parser.add_argument(
+            '--database', type=str, dest='database', default=None,
+            help='Database to load into. Default: default')
+
+    def handle(self, *args, **options):
+        loader = BulkLoader(
+            using=options['database'], batch_size=options['batch_size'], stdout=self.stdout)
+        for path in options['paths']:
+            self.stdout.write(path)
+            loader.load_file(path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {loader.created + loader.updated} objects: '
+            f'{loader.created} created, {loader.updated} updated.'))
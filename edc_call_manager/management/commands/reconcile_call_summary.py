@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from edc_call_manager.call_summary import reconcile_call_summary
+from edc_call_manager.caller_site import site_model_callers
+
+
+class Command(BaseCommand):
+
+    help = 'Recount calls and correct the call summary counts shown on the call manager home page'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', type=str, dest='database', default='default',
+            help='Database alias. Default: default')
+
+    def handle(self, *args, **options):
+        call_models = list({
+            model_caller.call_model for model_caller in site_model_callers.model_callers.values()})
+        corrected = reconcile_call_summary(call_models or None, using=options['database'])
+        if corrected:
+            self.stdout.write(self.style.WARNING(f'Corrected {corrected} call summary rows.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Call summary is up to date.'))
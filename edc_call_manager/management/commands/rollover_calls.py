@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from edc_call_manager.caller_site import site_model_callers
+from edc_call_manager.rollover import CallRollover
+
+
+class Command(BaseCommand):
+
+    help = 'Schedule the next call for closed, repeating calls that do not have one'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model_caller', type=str, nargs='*',
+            help='Model caller labels or start model app_label.model_name. Default: all repeating callers')
+        parser.add_argument(
+            '--chunk-size', type=int, dest='chunk_size', default=CallRollover.chunk_size,
+            help=f'Number of calls rolled over per transaction. Default: {CallRollover.chunk_size}')
+        parser.add_argument(
+            '--dry-run', action='store_true', dest='dry_run', default=False,
+            help='Count the calls that would be rolled over without creating them')
+
+    def handle(self, *args, **options):
+        if options['model_caller']:
+            model_callers = []
+            for name in options['model_caller']:
+                model_caller = site_model_callers.get_model_caller(name)
+                if not model_caller:
+                    raise CommandError(f'Unknown model caller. Got \'{name}\'')
+                model_callers.append(model_caller)
+        else:
+            model_callers = [
+                model_caller for model_caller in site_model_callers.model_callers.values()
+                if model_caller.repeats and model_caller.interval]
+        for model_caller in model_callers:
+            self.stdout.write(f'Rolling over calls for {model_caller.label} ...')
+            rollover = CallRollover(model_caller, chunk_size=options['chunk_size'], stdout=self.stdout)
+            created = rollover.rollover(dry_run=options['dry_run'])
+            self.stdout.write(self.style.SUCCESS(
+                '{} {} calls for {}. Skipped {}.'.format(
+                    'Found' if options['dry_run'] else 'Created', created, model_caller.label, rollover.skipped)))
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from edc_call_manager.scheduler_jobs import SchedulerWorker
+
+
+class Command(BaseCommand):
+
+    help = 'Run scheduler jobs added by model callers with enqueue_jobs = True'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, dest='workers', default=1,
+            help='Number of worker threads. Default: 1')
+        parser.add_argument(
+            '--batch-size', type=int, dest='batch_size', default=SchedulerWorker.batch_size,
+            help=f'Number of jobs each worker claims at a time. Default: {SchedulerWorker.batch_size}')
+        parser.add_argument(
+            '--max-attempts', type=int, dest='max_attempts', default=SchedulerWorker.max_attempts,
+            help=f'Number of attempts before a job is marked failed. Default: {SchedulerWorker.max_attempts}')
+        parser.add_argument(
+            '--poll-interval', type=float, dest='poll_interval', default=1.0,
+            help='Seconds a worker waits when there are no jobs. Default: 1')
+        parser.add_argument(
+            '--report-interval', type=float, dest='report_interval', default=60.0,
+            help='Seconds between throughput reports. Default: 60')
+        parser.add_argument(
+            '--once', action='store_true', dest='once', default=False,
+            help='Exit once there are no jobs available')
+
+    def handle(self, *args, **options):
+        for name in ['workers', 'batch_size', 'max_attempts']:
+            if options[name] < 1:
+                raise CommandError(f'Expected --{name.replace("_", "-")} to be at least 1. Got {options[name]}.')
+        stop_event = threading.Event()
+        workers = [
+            SchedulerWorker(batch_size=options['batch_size'], max_attempts=options['max_attempts'])
+            for _ in range(options['workers'])]
+        threads = [
+            threading.Thread(
+                target=self.run_worker, args=(worker, options['poll_interval'], stop_event, options['once']),
+                name=f'call-scheduler-{index}', daemon=True)
+            for index, worker in enumerate(workers)]
+        self.stdout.write(f'Starting {len(threads)} call scheduler worker(s) ...')
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=options['report_interval'] / len(threads))
+                self.report(workers, start)
+        except KeyboardInterrupt:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+        self.report(workers, start)
+        self.stdout.write(self.style.SUCCESS('Done.'))
+
+    def run_worker(self, worker, poll_interval, stop_event, once):
+        worker.name = f'{worker.name}-{threading.current_thread().name}'
+        try:
+            worker.run(poll_interval=poll_interval, stop_event=stop_event, once=once)
+        finally:
+            connection.close()
+
+    def report(self, workers, start):
+        elapsed = time.perf_counter() - start
+        done = sum(worker.done for worker in workers)
+        failed = sum(worker.failed for worker in workers)
+        rate = done / elapsed if elapsed else done
+        self.stdout.write(f'  {done} jobs done, {failed} failed ({rate:.1f} jobs/s)')
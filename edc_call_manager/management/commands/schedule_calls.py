@@ -1,7 +1,10 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.apps import apps as django_apps
 
+from edc_call_manager.bulk_scheduler import BulkCallScheduler
 from edc_call_manager.caller_site import site_model_callers
+from edc_call_manager.exceptions import ModelCallerError
+from edc_call_manager.scheduler_jobs import enqueue_schedules
 from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
 
 
@@ -12,6 +15,17 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
             'model_caller', type=str, help='Model caller app_label.model_name')
+        parser.add_argument(
+            '--bulk', action='store_true', dest='bulk', default=False,
+            help='Find subjects without a call in one query and create calls in chunks')
+        parser.add_argument(
+            '--chunk-size', type=int, dest='chunk_size', default=BulkCallScheduler.chunk_size,
+            help=f'Number of calls to create per transaction in bulk mode. '
+                 f'Default: {BulkCallScheduler.chunk_size}')
+        parser.add_argument(
+            '--enqueue', action='store_true', dest='enqueue', default=False,
+            help='Add scheduler jobs for subjects without a call instead of creating calls. '
+                 'Run the jobs with run_call_scheduler')
 
     def handle(self, *args, **options):
         try:
@@ -19,23 +33,39 @@ class Command(BaseCommand):
         except LookupError:
             raise CommandError(
                 'Unknown app_label.model_name. Got \'{}\''.format(options['model_caller']))
-        try:
-            model_caller = site_model_callers.get_model_caller(model)
-        except KeyError:
+        model_caller = site_model_callers.get_model_caller(model)
+        if not model_caller:
             raise CommandError('Unknown model caller for app_label.model_name. Got \'{}\''.format(
                 options['model_caller']))
         self.stdout.write(
             self.style.SUCCESS(f'Found model_caller {model_caller.label} with call model {model_caller.call_model}'))
-        new_calls = 0
-        for obj in model.objects.all():
+        if options['enqueue']:
+            scheduler = BulkCallScheduler(model_caller, chunk_size=options['chunk_size'])
+            try:
+                rows = scheduler.missing_subjects(model)
+            except ModelCallerError as e:
+                raise CommandError(e)
+            jobs = enqueue_schedules(model_caller, rows, batch_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f'Added {jobs} scheduler jobs.'))
+            return
+        elif options['bulk']:
+            scheduler = BulkCallScheduler(
+                model_caller, chunk_size=options['chunk_size'], stdout=self.stdout)
             try:
-                model_caller.call_model.objects.get(
-                    subject_identifier=obj.subject_identifier, label=model_caller.label)
-            except MultipleObjectsReturned:
-                pass
-            except ObjectDoesNotExist:
-                site_model_callers.schedule_calls(model, obj)
-                new_calls += 1
+                new_calls = scheduler.schedule_missing(model)
+            except ModelCallerError as e:
+                raise CommandError(e)
+        else:
+            new_calls = 0
+            for obj in model.objects.all():
+                try:
+                    model_caller.call_model.objects.get(
+                        subject_identifier=obj.subject_identifier, label=model_caller.label)
+                except MultipleObjectsReturned:
+                    pass
+                except ObjectDoesNotExist:
+                    site_model_callers.schedule_calls(model, obj)
+                    new_calls += 1
         if new_calls > 0:
             self.stdout.write(
                 self.style.SUCCESS('Successfully scheduled calls for {} {}'.format(
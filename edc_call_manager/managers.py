@@ -1,14 +1,66 @@
+from functools import reduce
+from operator import or_
+
 from django.contrib.admin.models import LogEntryManager
 from django.db import models
+from django.db.models import Q
+
+
+class NaturalKeysManagerMixin:
+
+    """A manager mixin that resolves many natural keys with one query per batch
+    instead of one query per key.
+
+    `natural_key_fields` are the lookups of the natural key in the order of
+    `natural_key()`."""
+
+    natural_key_fields = []
+    natural_key_related = None
+    natural_key_batch_size = 500
 
+    def get_natural_key_field(self, lookup):
+        model = self.model
+        for name in lookup.split('__'):
+            field = model._meta.get_field(name)
+            model = field.related_model
+        return field
 
-class CallManager(models.Manager):
+    def to_natural_key(self, natural_key):
+        """Returns the natural key as a tuple of python values, e.g. from a
+        deserialized JSON list."""
+        return tuple(
+            self.get_natural_key_field(lookup).to_python(value)
+            for lookup, value in zip(self.natural_key_fields, natural_key))
+
+    def get_by_natural_keys(self, natural_keys):
+        """Returns a dictionary of instances by natural key for the natural keys
+        that exist."""
+        natural_keys = list({self.to_natural_key(natural_key) for natural_key in natural_keys})
+        instances = {}
+        for index in range(0, len(natural_keys), self.natural_key_batch_size):
+            condition = reduce(or_, [
+                Q(**dict(zip(self.natural_key_fields, natural_key)))
+                for natural_key in natural_keys[index:index + self.natural_key_batch_size]])
+            queryset = self.filter(condition)
+            if self.natural_key_related:
+                queryset = queryset.select_related(self.natural_key_related)
+            for instance in queryset:
+                instances[instance.natural_key()] = instance
+        return instances
+
+
+class CallManager(NaturalKeysManagerMixin, models.Manager):
+
+    natural_key_fields = ['subject_identifier', 'label', 'scheduled']
 
     def get_by_natural_key(self, subject_identifier, label, scheduled):
         return self.get(subject_identifier=subject_identifier, label=label, scheduled=scheduled)
 
 
-class LogManager(models.Manager):
+class LogManager(NaturalKeysManagerMixin, models.Manager):
+
+    natural_key_fields = ['log_datetime', 'call__subject_identifier', 'call__label', 'call__scheduled']
+    natural_key_related = 'call'
 
     def get_by_natural_key(self, log_datetime, subject_identifier, label, scheduled):
         return self.get(
@@ -18,7 +70,12 @@ class LogManager(models.Manager):
             call__scheduled=scheduled)
 
 
-class LogEntryManager(LogEntryManager):
+class LogEntryManager(NaturalKeysManagerMixin, LogEntryManager):
+
+    natural_key_fields = [
+        'call_datetime', 'log__log_datetime', 'log__call__subject_identifier',
+        'log__call__label', 'log__call__scheduled']
+    natural_key_related = 'log__call'
 
     def get_by_natural_key(self, call_datetime, log_datetime, subject_identifier, label, scheduled):
         return self.get(
@@ -0,0 +1,63 @@
+from django.db import migrations, models
+from edc_constants.constants import CLOSED
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edc_call_manager', '0002_auto_20201016_0812'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='call',
+            name='claimed_by',
+            field=models.CharField(editable=False, help_text='username of the staff member working this call. See CallClaim.', max_length=150, null=True),
+        ),
+        migrations.AddField(
+            model_name='call',
+            name='claimed_until',
+            field=models.DateTimeField(editable=False, help_text='The claim lapses after this time.', null=True),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='locator_digest',
+            field=models.CharField(editable=False, help_text='Keyed HMAC-SHA256 of locator_information, to skip unchanged locator updates.', max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='call',
+            index=models.Index(fields=['subject_identifier', 'label', 'call_status'], name='edc_call_ma_subject_86e7d1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='call',
+            index=models.Index(fields=['label', 'call_status', 'scheduled'], name='edc_call_ma_label_016ce1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='call',
+            index=models.Index(fields=['modified', 'id'], name='edc_call_ma_modifie_847857_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='call',
+            index=models.Index(condition=~models.Q(call_status=CLOSED), fields=['label', 'scheduled', 'id'], name='edc_call_due_label_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='call',
+            index=models.Index(condition=~models.Q(call_status=CLOSED), fields=['scheduled', 'id'], name='edc_call_due_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='call',
+            index=models.Index(condition=~models.Q(call_status=CLOSED), fields=['label', 'scheduled', 'claimed_until'], name='edc_call_claim_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['modified', 'id'], name='edc_call_ma_modifie_a16bdb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['log', '-call_datetime'], name='edc_call_ma_log_id_7b3d0a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['modified', 'id'], name='edc_call_ma_modifie_3466b3_idx'),
+        ),
+    ]
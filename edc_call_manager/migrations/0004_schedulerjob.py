@@ -0,0 +1,51 @@
+import _socket
+from django.db import migrations, models
+import django_revision.revision_field
+import edc_base.model_fields.hostname_modification_field
+import edc_base.model_fields.userfield
+import edc_base.model_fields.uuid_auto_field
+import edc_base.utils
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edc_call_manager', '0003_call_manager_fields_and_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerJob',
+            fields=[
+                ('created', models.DateTimeField(blank=True, default=edc_base.utils.get_utcnow)),
+                ('modified', models.DateTimeField(blank=True, default=edc_base.utils.get_utcnow)),
+                ('user_created', edc_base.model_fields.userfield.UserField(blank=True, help_text='Updated by admin.save_model', max_length=50, verbose_name='user created')),
+                ('user_modified', edc_base.model_fields.userfield.UserField(blank=True, help_text='Updated by admin.save_model', max_length=50, verbose_name='user modified')),
+                ('hostname_created', models.CharField(blank=True, default=_socket.gethostname, help_text='System field. (modified on create only)', max_length=60)),
+                ('hostname_modified', edc_base.model_fields.hostname_modification_field.HostnameModificationField(blank=True, help_text='System field. (modified on every save)', max_length=50)),
+                ('revision', django_revision.revision_field.RevisionField(blank=True, editable=False, help_text='System field. Git repository tag:branch:commit.', max_length=75, null=True, verbose_name='Revision')),
+                ('device_created', models.CharField(blank=True, max_length=10)),
+                ('device_modified', models.CharField(blank=True, max_length=10)),
+                ('id', edc_base.model_fields.uuid_auto_field.UUIDAutoField(blank=True, editable=False, help_text='System auto field. UUID primary key.', primary_key=True, serialize=False)),
+                ('job_type', models.CharField(choices=[('schedule', 'Schedule a call'), ('unschedule', 'Unschedule calls'), ('rollover', 'Schedule the next call')], max_length=15)),
+                ('label', models.CharField(help_text='model caller label', max_length=50)),
+                ('subject_identifier', models.CharField(max_length=50, null=True)),
+                ('scheduled', models.DateField(help_text='scheduled date of the call for a schedule job', null=True)),
+                ('call_pk', models.CharField(help_text='the closed call for a rollover job', max_length=36, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=15)),
+                ('attempts', models.IntegerField(default=0)),
+                ('available_datetime', models.DateTimeField(default=edc_base.utils.get_utcnow, help_text='the job may not be claimed before this time')),
+                ('locked_by', models.CharField(max_length=100, null=True)),
+                ('locked_datetime', models.DateTimeField(null=True)),
+                ('completed_datetime', models.DateTimeField(null=True)),
+                ('last_error', models.TextField(null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='schedulerjob',
+            index=models.Index(fields=['status', 'available_datetime'], name='edc_call_job_status_idx'),
+        ),
+    ]
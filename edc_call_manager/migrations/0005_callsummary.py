@@ -0,0 +1,64 @@
+import _socket
+from django.db import migrations, models
+from django.db.models import Count
+import django_revision.revision_field
+import edc_base.model_fields.hostname_modification_field
+import edc_base.model_fields.userfield
+import edc_base.model_fields.uuid_auto_field
+import edc_base.utils
+from edc_constants.constants import CLOSED
+
+
+def populate_call_summary(apps, schema_editor):
+    """Counts the calls by label, call status and scheduled date. Closed calls are
+    counted without a date."""
+    Call = apps.get_model('edc_call_manager', 'call')
+    CallSummary = apps.get_model('edc_call_manager', 'callsummary')
+    db_alias = schema_editor.connection.alias
+    counts = {}
+    for row in Call.objects.using(db_alias).order_by().values(
+            'label', 'call_status', 'scheduled').annotate(count=Count('pk')):
+        key = (row['label'], row['call_status'], None if row['call_status'] == CLOSED else row['scheduled'])
+        counts[key] = counts.get(key, 0) + row['count']
+    CallSummary.objects.using(db_alias).bulk_create(
+        [CallSummary(label=label, call_status=call_status, scheduled=scheduled, count=count)
+         for (label, call_status, scheduled), count in counts.items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('edc_call_manager', '0004_schedulerjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallSummary',
+            fields=[
+                ('created', models.DateTimeField(blank=True, default=edc_base.utils.get_utcnow)),
+                ('modified', models.DateTimeField(blank=True, default=edc_base.utils.get_utcnow)),
+                ('user_created', edc_base.model_fields.userfield.UserField(blank=True, help_text='Updated by admin.save_model', max_length=50, verbose_name='user created')),
+                ('user_modified', edc_base.model_fields.userfield.UserField(blank=True, help_text='Updated by admin.save_model', max_length=50, verbose_name='user modified')),
+                ('hostname_created', models.CharField(blank=True, default=_socket.gethostname, help_text='System field. (modified on create only)', max_length=60)),
+                ('hostname_modified', edc_base.model_fields.hostname_modification_field.HostnameModificationField(blank=True, help_text='System field. (modified on every save)', max_length=50)),
+                ('revision', django_revision.revision_field.RevisionField(blank=True, editable=False, help_text='System field. Git repository tag:branch:commit.', max_length=75, null=True, verbose_name='Revision')),
+                ('device_created', models.CharField(blank=True, max_length=10)),
+                ('device_modified', models.CharField(blank=True, max_length=10)),
+                ('id', edc_base.model_fields.uuid_auto_field.UUIDAutoField(blank=True, editable=False, help_text='System auto field. UUID primary key.', primary_key=True, serialize=False)),
+                ('label', models.CharField(help_text='model caller label', max_length=50)),
+                ('call_status', models.CharField(max_length=15)),
+                ('scheduled', models.DateField(help_text='None for closed calls', null=True)),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='callsummary',
+            constraint=models.UniqueConstraint(fields=('label', 'call_status', 'scheduled', 'shard'), name='edc_call_summary_key_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='callsummary',
+            constraint=models.UniqueConstraint(condition=models.Q(scheduled__isnull=True), fields=('label', 'call_status', 'shard'), name='edc_call_summary_undated_uniq'),
+        ),
+        migrations.RunPython(populate_call_summary, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,17 @@
 from django.apps import apps as django_apps
-from django.core.exceptions import MultipleObjectsReturned
 from django.db import models
 
-app_config = django_apps.get_app_config('edc_call_manager')
+from edc_base.utils import get_utcnow
+
+from .utils import chunked, get_locator_digest
 
 
 class CallLogLocatorMixin(models.Model):
 
     """A Locator model mixin that has the Locator model update the Log if changed."""
 
+    call_log_batch_size = 500
+
     def save(self, *args, **kwargs):
         self.update_call_log()
         super(CallLogLocatorMixin, self).save(*args, **kwargs)
@@ -16,7 +19,7 @@ class CallLogLocatorMixin(models.Model):
     def get_call_log_model(self):
         """If using the edc_call_manager, return the Log model so it can be updated."""
         try:
-            return django_apps.get_model(app_config.label, 'log')
+            return django_apps.get_model('edc_call_manager', 'log')
         except LookupError:
             return None
 
@@ -25,19 +28,24 @@ class CallLogLocatorMixin(models.Model):
         return dict(call__registered_subject=self.registered_subject)
 
     def update_call_log(self):
-        """If using the edc_call_manager, update the Log model otherwise do nothing."""
+        """If using the edc_call_manager, update the Log model otherwise do nothing.
+
+        Logs with the same locator digest are skipped. Changed logs are updated with one
+        queryset update per batch, so the locator is encrypted once per batch and
+        post_save is not sent for each log. Returns the number of logs updated."""
         Log = self.get_call_log_model()
+        updated = 0
         if Log:
-            try:
-                log = Log.objects.get(**self.get_call_log_options())
-                log.locator_information = self.to_string()
-                log.save()
-            except MultipleObjectsReturned:
-                for log in Log.objects.filter(**self.get_call_log_options()):
-                    log.locator_information = self.to_string()
-                    log.save()
-            except Log.DoesNotExist:
-                pass
+            locator_information = self.to_string()
+            locator_digest = get_locator_digest(locator_information)
+            pks = Log.objects.filter(**self.get_call_log_options()).exclude(
+                locator_digest=locator_digest).values_list('pk', flat=True)
+            for chunk in chunked(list(pks), self.call_log_batch_size):
+                updated += Log.objects.filter(pk__in=chunk).update(
+                    locator_information=locator_information,
+                    locator_digest=locator_digest,
+                    modified=get_utcnow())
+        return updated
 
     class Meta:
         abstract = True
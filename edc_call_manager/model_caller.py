@@ -1,17 +1,19 @@
 from datetime import date
-from dateutil.relativedelta import relativedelta
 
 from django.apps import apps as django_apps
 from django.core.exceptions import MultipleObjectsReturned, ImproperlyConfigured, ValidationError
+from django.db.models import Count, F, Subquery
 from django.utils.text import slugify
 
 from edc_base.utils import get_utcnow
 from edc_constants.constants import CLOSED, YES, DEAD, NO
 
+from .business_calendar import BusinessCalendar
+from .call_summary import close_calls
 from .constants import DAILY, WEEKLY, MONTHLY, QUARTELY, YEARLY, OPEN_CALL, NEW_CALL
 from .exceptions import ModelCallerError
-
-app_config = django_apps.get_app_config('edc_call_manager')
+from .instrumentation import instrumented
+from .utils import chunked
 
 
 class ModelCaller:
@@ -26,13 +28,19 @@ class ModelCaller:
     log_model = None
     log_entry_model = None
     consent_model = None
+    holidays = None  # list of dates skipped when computing the next scheduled date
+    defer_scheduling = False  # if True, schedule and unschedule once the transaction commits
+    enqueue_jobs = False  # if True, add jobs for the `run_call_scheduler` command instead
     interval = None
     label = None
+    locator_fields = None  # locator fields formatted into locator_information. Default: all, except relations
     locator_filter = 'subject_identifier'
     locator_model = None
+    lookup_chunk_size = 500  # max subject identifiers per `__in` lookup in the batch methods
     repeat_times = 0
     subject_model = None  # model with PII attrs. Default: RegisteredSubject
     verbose_name = None
+    weekmask = None  # business days, Monday first. Default: '1111100'. See BusinessCalendar
 
     def __init__(self, start_model, stop_model):
         self.consent_model_fk = None
@@ -81,11 +89,13 @@ class ModelCaller:
                         self.__class__.__name__, attr))
         if self.consent_model:
             self.consent_model_name = self.consent_model._meta.label
+        self.locator_field_names = self.get_locator_field_names()
         label = self.label or self.__class__.__name__
         self.label = slugify(str(label))
         if self.interval not in [DAILY, WEEKLY, MONTHLY, QUARTELY, YEARLY, None]:
             raise ValueError(
                 'ModelCaller expected an \'interval\' for a call scheduled to repeat. Got None.')
+        self.business_calendar = BusinessCalendar(weekmask=self.weekmask, holidays=self.holidays)
         self.repeats = False
         if self.stop_model:
             if self.repeat_times > 0 or self.interval:
@@ -147,8 +157,82 @@ class ModelCaller:
                     'Got \'{}\''.format(self.label, subject_identifier, str(e)))
         return consent
 
+    def subjects(self, subject_identifiers):
+        """Returns a dictionary of subject model instances by subject_identifier.
+
+        Subjects not found are not included."""
+        subjects = {}
+        if self.subject_model:
+            for chunk in chunked(set(subject_identifiers), self.lookup_chunk_size):
+                for subject in self.subject_model.objects.filter(subject_identifier__in=chunk):
+                    subjects[subject.subject_identifier] = subject
+        return subjects
+
+    def consents(self, subject_identifiers):
+        """Returns a dictionary of consent model instances by subject_identifier.
+
+        As with `consent`, the consent for the current period is used if a subject has
+        more than one consent. Subjects without a consent are not included. The
+        `consent_model_fk` instance is fetched in the same query."""
+        consents = {}
+        if self.consent_model:
+            multiple = set()
+            queryset = self.consent_model.objects.all()
+            if self.consent_model_fk:
+                queryset = queryset.select_related(self.consent_model_fk)
+            for chunk in chunked(set(subject_identifiers), self.lookup_chunk_size):
+                for consent in queryset.filter(subject_identifier__in=chunk):
+                    if consent.subject_identifier in consents:
+                        multiple.add(consent.subject_identifier)
+                    consents[consent.subject_identifier] = consent
+            for subject_identifier in multiple:
+                consents[subject_identifier] = self.consent_model.consent.consent_for_period(
+                    subject_identifier, get_utcnow())
+        return consents
+
+    def personal_details_from_subjects(self, subject_identifiers):
+        """Returns a dictionary of Call options by subject_identifier from the subject model.
+
+        See also `personal_details_from_subject`."""
+        subjects = self.subjects(subject_identifiers)
+        personal_details = {}
+        for subject_identifier in subject_identifiers:
+            subject = subjects.get(subject_identifier)
+            if subject:
+                options = {'subject_identifier': subject.subject_identifier,
+                           'first_name': subject.first_name,
+                           'initials': subject.initials}
+            else:
+                options = {'subject_identifier': subject_identifier}
+            personal_details[subject_identifier] = options
+        return personal_details
+
+    def personal_details_from_consents(self, subject_identifiers):
+        """Returns a dictionary of Call options by subject_identifier from the consent model.
+
+        Unlike `personal_details_from_consent`, subjects without a consent are not
+        included instead of raising a ValueError."""
+        personal_details = {}
+        for subject_identifier, consent in self.consents(subject_identifiers).items():
+            options = {'subject_identifier': consent.subject_identifier,
+                       'first_name': consent.first_name,
+                       'initials': consent.initials}
+            if self.consent_model_fk:
+                options.update({self.consent_model_fk: getattr(consent, self.consent_model_fk)})
+            personal_details[subject_identifier] = options
+        return personal_details
+
+    def personal_details(self, subject_identifiers):
+        """Returns a dictionary of Call options by subject_identifier from either the
+        consent or subject model."""
+        if self.consent_model:
+            return self.personal_details_from_consents(subject_identifiers)
+        return self.personal_details_from_subjects(subject_identifiers)
+
+    @instrumented('schedule_call')
     def schedule_call(self, instance, scheduled=None):
-        """Schedules a call by creating a new call instance and creates the corresponding Log instance.
+        """Schedules a call by creating a new call instance and creates the corresponding Log instance
+        and returns the call.
 
         `instance` is a start_model instance"""
         if self.consent_model:
@@ -164,60 +248,69 @@ class ModelCaller:
         self.log_model.objects.create(
             call=call,
             locator_information=self.get_locator(instance))
+        return call
 
+    @instrumented('unschedule_call', rows=lambda closed: closed)
     def unschedule_call(self, subject_identifier):
-        """Unschedules any calls for this subject and model caller.
-
-        `instance` is a stop_model instance"""
-        self.call_model.objects.filter(
+        """Unschedules any calls for this subject and model caller and returns the
+        number of calls closed."""
+        closed = close_calls(self.call_model.objects.filter(
             subject_identifier=subject_identifier,
-            label=self.label).exclude(
-                call_status=CLOSED).update(
-                    call_status=CLOSED,
-                    auto_closed=True)
+            label=self.label))
+        return sum(closed.values())
 
+    def bulk_unschedule_calls(self, subject_identifiers):
+        """Unschedules any calls for these subjects and model caller and returns the
+        number of calls closed."""
+        closed = 0
+        for chunk in chunked(set(subject_identifiers), self.lookup_chunk_size):
+            closed += sum(close_calls(self.call_model.objects.filter(
+                subject_identifier__in=chunk,
+                label=self.label)).values())
+        return closed
+
+    @instrumented('schedule_next_call')
     def schedule_next_call(self, call, scheduled_date=None):
-        """Schedules the next call if either scheduled_date is provided or can be calculated."""
+        """Schedules the next call if either scheduled_date is provided or can be calculated
+        and returns the new call or None."""
         scheduled_date = scheduled_date or self.get_next_scheduled_date(
-            call.call_datetime)
+            call.call_datetime or call.scheduled)
         if scheduled_date:
-            self.schedule_call(call, scheduled_date)
+            return self.schedule_call(call, scheduled_date)
+        return None
 
     def get_next_scheduled_date(self, reference_date):
         """Returns the next scheduled date or None based on the interval.
 
-        TODO: This needs to be a bit more sophisticated to avoid holidays, weekends, etc."""
-        scheduled_date = None
-        if self.interval == DAILY:
-            scheduled_date = reference_date + relativedelta(days=+1)
-        elif self.interval == WEEKLY:
-            scheduled_date = reference_date + \
-                relativedelta(days=+1, weekday=reference_date.weekday())
-        elif self.interval == MONTHLY:
-            scheduled_date = reference_date + \
-                relativedelta(months=+1, weekday=reference_date.weekday())
-        elif self.interval == QUARTELY:
-            scheduled_date = reference_date + \
-                relativedelta(months=+3, weekday=reference_date.weekday())
-        else:
-            pass
-        return scheduled_date
+        The date is rolled forward past weekends and holidays. See BusinessCalendar."""
+        return self.business_calendar.next_date(reference_date, self.interval)
+
+    def get_next_scheduled_dates(self, reference_dates):
+        """Returns a list of next scheduled dates, or None, for a list of reference dates."""
+        return self.business_calendar.next_dates(reference_dates, self.interval)
 
+    @instrumented('update_call_from_log', rows=lambda call: 1 if call else 0)
     def update_call_from_log(self, call, log_entry, commit=True):
         """Updates the call_model instance with information from the log entry
-        for this subject and model caller.
+        for this subject and model caller and returns the call or None.
+
+        Only updates call if this is the most recent log_entry.
 
-        Only updates call if this is the most recent log_entry."""
-        log_entries = self.log_entry_model.objects.filter(
-            log=log_entry.log).order_by('-call_datetime')
-        if log_entry.pk == log_entries[0].pk:
-            call = self.call_model.objects.get(pk=call.pk)
+        The call, the most recent log entry and the number of log entries are
+        fetched in one query."""
+        log_entries = self.log_entry_model.objects.filter(log=log_entry.log).order_by()
+        call = self.call_model.objects.annotate(
+            latest_log_entry_pk=Subquery(
+                log_entries.order_by('-call_datetime').values('pk')[:1]),
+            log_entry_count=Subquery(
+                log_entries.values('log').annotate(count=Count('pk')).values('count'))).get(pk=call.pk)
+        if log_entry.pk == call.latest_log_entry_pk:
             if call.call_status == CLOSED:
                 raise ValidationError(
                     'Call is closed. Perhaps catch this in the form.')
             call.call_outcome = '. '.join(log_entry.outcome)
             call.call_datetime = log_entry.call_datetime
-            call.call_attempts = log_entries.count()
+            call.call_attempts = call.log_entry_count
             survival_status = getattr(log_entry, 'survival_status', '')
             if log_entry.may_call == NO or survival_status == DEAD:
                 if survival_status == DEAD:
@@ -232,6 +325,8 @@ class ModelCaller:
             call.user_modified = log_entry.user_modified
             if commit:
                 call.save()
+            return call
+        return None
 
     def appointment_handler(self, call, log_entry):
         """Called by LogEntry post_save signal."""
@@ -242,25 +337,63 @@ class ModelCaller:
                 appt_status=NEW_CALL,
             )
 
+    def get_locator_field_names(self):
+        """Returns the list of locator field names formatted into locator_information.
+
+        Either the declared `locator_fields` or the concrete fields that are not
+        relations, in model order."""
+        concrete_fields = [field.name for field in self.locator_model._meta.concrete_fields
+                           if not field.is_relation]
+        if self.locator_fields is None:
+            return concrete_fields
+        unknown = [name for name in self.locator_fields
+                   if name not in [field.name for field in self.locator_model._meta.concrete_fields]]
+        if unknown:
+            raise ImproperlyConfigured(
+                'ModelCaller locator model \'{}\' does not have fields {}. See {} declaration for '
+                'attribute locator_fields.'.format(
+                    self.locator_model._meta.label_lower, unknown, self.__class__.__name__))
+        return list(self.locator_fields)
+
+    @instrumented('get_locator')
     def get_locator(self, instance):
-        """Returns the locator instance as a formatted string."""
+        """Returns the locator as a formatted string.
+
+        Only the `locator_field_names` columns are fetched; with none, the locator is
+        not queried, as `values()` would fetch every column."""
         locator_str = ''
-        if self.locator_model:
+        if self.locator_model and self.locator_field_names:
             locator_filter = self.locator_filter or 'subject_identifier'
             options = {locator_filter: instance.subject_identifier}
             try:
-                locator = self.locator_model.objects.get(**options)
+                values = self.locator_model.objects.values(*self.locator_field_names).get(**options)
             except self.locator_model.DoesNotExist:
                 locator_str = 'locator not found.'
             else:
-                for fname in self.locator_model._meta.get_fields():
-                    value = getattr(locator, fname.name)
-                    if not isinstance(value, str):
-                        value = str(value)
-                    locator_str += value + ' '
-                locator_str = locator_str[:-1]
+                locator_str = self.format_locator(values)
         return locator_str
 
+    def get_locators(self, subject_identifiers):
+        """Returns a dictionary of locators as formatted strings by subject_identifier.
+
+        See also `get_locator`."""
+        locators = {subject_identifier: '' for subject_identifier in subject_identifiers}
+        if self.locator_model and self.locator_field_names:
+            locators = {subject_identifier: 'locator not found.' for subject_identifier in subject_identifiers}
+            locator_filter = self.locator_filter or 'subject_identifier'
+            for chunk in chunked(set(subject_identifiers), self.lookup_chunk_size):
+                rows = self.locator_model.objects.filter(
+                    **{f'{locator_filter}__in': chunk}).values(
+                        *self.locator_field_names,
+                        call_manager_subject_identifier=F(locator_filter))
+                for values in rows:
+                    locators[values['call_manager_subject_identifier']] = self.format_locator(values)
+        return locators
+
+    def format_locator(self, values):
+        """Returns a formatted string from a dictionary of locator values by field name."""
+        return ' '.join(str(values[name]) for name in self.locator_field_names)
+
     def get_value(self, instance, attr):
         try:
             value = getattr(instance, attr)
@@ -14,6 +14,22 @@ from .choices import (
     CONTACT_TYPE, APPT_GRADING, APPT_LOCATIONS, MAY_CALL, CALL_REASONS, APPT_REASONS_UNWILLING)
 from .constants import NEW_CALL, OPEN_CALL
 from .managers import CallManager, LogManager, LogEntryManager
+from .utils import get_locator_digest
+
+
+class MixinIndex(models.Index):
+    """An unnamed index for an abstract model mixin that is named for each concrete model.
+
+    Django would otherwise name it once from the abstract model and every concrete
+    model using the mixin would share the index name."""
+
+    def set_name_with_model(self, model):
+        if not model._meta.abstract:
+            super().set_name_with_model(model)
+
+    def deconstruct(self):
+        _, args, kwargs = super().deconstruct()
+        return 'django.db.models.Index', args, kwargs
 
 
 class CallModelMixin(models.Model):
@@ -72,11 +88,30 @@ class CallModelMixin(models.Model):
         editable=False,
         help_text='If True call status was changed to CLOSED by EDC.')
 
+    claimed_by = models.CharField(
+        max_length=150,
+        null=True,
+        editable=False,
+        help_text='username of the staff member working this call. See CallClaim.')
+
+    claimed_until = models.DateTimeField(
+        null=True,
+        editable=False,
+        help_text='The claim lapses after this time.')
+
     objects = CallManager()
 
     def natural_key(self):
         return (self.subject_identifier, self.label, self.scheduled)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not {'label', 'call_status', 'scheduled'}.difference(field_names):
+            # the key as loaded, to update CallSummary on save. See call_summary.
+            instance.call_summary_key = (instance.label, instance.call_status, instance.scheduled)
+        return instance
+
     def __str__(self):
         return '{} {} ({}) {} {}'.format(
             self.subject_identifier,
@@ -87,6 +122,11 @@ class CallModelMixin(models.Model):
 
     class Meta:
         unique_together = ('subject_identifier', 'label', 'scheduled', )
+        indexes = [
+            MixinIndex(fields=['subject_identifier', 'label', 'call_status']),
+            MixinIndex(fields=['label', 'call_status', 'scheduled']),
+            MixinIndex(fields=['modified', 'id']),
+        ]
         abstract = True
 
 
@@ -98,6 +138,12 @@ class LogModelMixin(models.Model):
         null=True,
         help_text='This information has been imported from the previous locator. You may update as required.')
 
+    locator_digest = models.CharField(
+        max_length=64,
+        null=True,
+        editable=False,
+        help_text='Keyed HMAC-SHA256 of locator_information, to skip unchanged locator updates.')
+
     contact_notes = EncryptedTextField(
         null=True,
         blank=True,
@@ -105,6 +151,13 @@ class LogModelMixin(models.Model):
 
     objects = LogManager()
 
+    def save(self, *args, **kwargs):
+        self.locator_digest = get_locator_digest(self.locator_information)
+        update_fields = kwargs.get('update_fields')
+        if update_fields and 'locator_information' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'locator_digest'}
+        super().save(*args, **kwargs)
+
     def natural_key(self):
         return (self.log_datetime, ) + self.call.natural_key()
 
@@ -113,6 +166,9 @@ class LogModelMixin(models.Model):
 
     class Meta:
         unique_together = ('log_datetime', 'call', )
+        indexes = [
+            MixinIndex(fields=['modified', 'id']),
+        ]
         abstract = True
 
 
@@ -250,4 +306,8 @@ class LogEntryModelMixin (models.Model):
 
     class Meta:
         unique_together = ('call_datetime', 'log')
+        indexes = [
+            MixinIndex(fields=['log', '-call_datetime']),
+            MixinIndex(fields=['modified', 'id']),
+        ]
         abstract = True
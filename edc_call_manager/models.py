@@ -1,7 +1,12 @@
 from django.db import models
+from django.db.models import Q
 
 from edc_base.model_mixins import BaseUuidModel
+from edc_base.utils import get_utcnow
+from edc_constants.constants import CLOSED
 
+from .choices import JOB_STATUS, JOB_TYPES
+from .constants import PENDING_JOB
 from .model_mixins import CallModelMixin, LogModelMixin, LogEntryModelMixin
 
 
@@ -9,6 +14,20 @@ class Call(CallModelMixin, BaseUuidModel):
 
     class Meta(CallModelMixin.Meta):
         app_label = 'edc_call_manager'
+        indexes = CallModelMixin.Meta.indexes + [
+            models.Index(
+                fields=['label', 'scheduled', 'id'],
+                condition=~Q(call_status=CLOSED),
+                name='edc_call_due_label_sched_idx'),
+            models.Index(
+                fields=['scheduled', 'id'],
+                condition=~Q(call_status=CLOSED),
+                name='edc_call_due_sched_idx'),
+            models.Index(
+                fields=['label', 'scheduled', 'claimed_until'],
+                condition=~Q(call_status=CLOSED),
+                name='edc_call_claim_idx'),
+        ]
 
 
 class Log(LogModelMixin, BaseUuidModel):
@@ -25,3 +44,134 @@ class LogEntry(LogEntryModelMixin, BaseUuidModel):
 
     class Meta(LogEntryModelMixin.Meta):
         app_label = 'edc_call_manager'
+
+
+class SchedulerJob(BaseUuidModel):
+
+    """A durable schedule, unschedule or rollover job claimed and run by the
+    `run_call_scheduler` management command."""
+
+    job_type = models.CharField(
+        max_length=15,
+        choices=JOB_TYPES)
+
+    label = models.CharField(
+        max_length=50,
+        help_text='model caller label')
+
+    subject_identifier = models.CharField(
+        max_length=50,
+        null=True)
+
+    scheduled = models.DateField(
+        null=True,
+        help_text='scheduled date of the call for a schedule job')
+
+    call_pk = models.CharField(
+        max_length=36,
+        null=True,
+        help_text='the closed call for a rollover job')
+
+    status = models.CharField(
+        max_length=15,
+        choices=JOB_STATUS,
+        default=PENDING_JOB)
+
+    attempts = models.IntegerField(
+        default=0)
+
+    available_datetime = models.DateTimeField(
+        default=get_utcnow,
+        help_text='the job may not be claimed before this time')
+
+    locked_by = models.CharField(
+        max_length=100,
+        null=True)
+
+    locked_datetime = models.DateTimeField(
+        null=True)
+
+    completed_datetime = models.DateTimeField(
+        null=True)
+
+    last_error = models.TextField(
+        null=True)
+
+    def __str__(self):
+        return '{} {} {} ({})'.format(
+            self.job_type, self.label, self.subject_identifier or self.call_pk, self.status)
+
+    class Meta:
+        app_label = 'edc_call_manager'
+        indexes = [
+            models.Index(fields=['status', 'available_datetime'], name='edc_call_job_status_idx'),
+        ]
+
+
+class CallSummary(BaseUuidModel):
+
+    """The number of calls by model caller label, call status and scheduled date,
+    in up to SUMMARY_SHARDS rows per key. Closed calls are counted without a date.
+
+    Updated incrementally as calls are created, closed or rescheduled. See
+    call_summary and the `reconcile_call_summary` management command."""
+
+    label = models.CharField(
+        max_length=50,
+        help_text='model caller label')
+
+    call_status = models.CharField(
+        max_length=15)
+
+    scheduled = models.DateField(
+        null=True,
+        help_text='None for closed calls')
+
+    shard = models.PositiveSmallIntegerField(
+        default=0)
+
+    count = models.IntegerField(
+        default=0)
+
+    def __str__(self):
+        return '{} {} {}: {}'.format(self.label, self.call_status, self.scheduled, self.count)
+
+    class Meta:
+        app_label = 'edc_call_manager'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['label', 'call_status', 'scheduled', 'shard'],
+                name='edc_call_summary_key_uniq'),
+            models.UniqueConstraint(
+                fields=['label', 'call_status', 'shard'],
+                condition=Q(scheduled__isnull=True),
+                name='edc_call_summary_undated_uniq'),
+        ]
+
+
+class SyncWatermark(BaseUuidModel):
+
+    """The (modified, id) of the last row exported to a destination for a model.
+
+    See sync_export and the `export_call_changes` management command."""
+
+    destination = models.CharField(
+        max_length=100)
+
+    model = models.CharField(
+        max_length=100,
+        help_text='app_label.model_name')
+
+    last_modified = models.DateTimeField(
+        null=True)
+
+    last_pk = models.CharField(
+        max_length=36,
+        null=True)
+
+    def __str__(self):
+        return '{} {} {} {}'.format(self.destination, self.model, self.last_modified, self.last_pk)
+
+    class Meta:
+        app_label = 'edc_call_manager'
+        unique_together = ('destination', 'model', )
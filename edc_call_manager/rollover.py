@@ -0,0 +1,96 @@
+import time
+
+from django.db.models import Exists, OuterRef
+
+from edc_constants.constants import CLOSED
+
+from .bulk_scheduler import BulkCallScheduler
+
+
+class CallRollover:
+    """A class that schedules the next call for closed, repeating calls of a model
+    caller that do not have a later call.
+
+    A call saved as closed is rolled over by the Call post_save signal. Calls closed
+    with a queryset update are not, and are found here with one anti-join per chunk.
+    Next dates are computed in bulk with the model caller's business calendar and the
+    calls and logs are created with `BulkCallScheduler.create_calls`.
+
+    Calls closed automatically by a stop model are not rolled over. Running again
+    finds no calls that were rolled over, so the rollover may be run at any time.
+
+    For example:
+
+        CallRollover(model_caller, chunk_size=1000, stdout=self.stdout).rollover()
+    """
+
+    chunk_size = 1000
+
+    def __init__(self, model_caller, chunk_size=None, stdout=None):
+        self.model_caller = model_caller
+        self.chunk_size = chunk_size or self.chunk_size
+        self.stdout = stdout
+        self.created = 0
+        self.skipped = 0
+
+    @property
+    def queryset(self):
+        """Returns a queryset of closed, repeating calls without a later call."""
+        call_model = self.model_caller.call_model
+        later_calls = call_model.objects.filter(
+            subject_identifier=OuterRef('subject_identifier'),
+            label=OuterRef('label'),
+            scheduled__gt=OuterRef('scheduled'))
+        return call_model.objects.filter(
+            label=self.model_caller.label,
+            call_status=CLOSED,
+            repeats=True,
+            auto_closed=False).filter(~Exists(later_calls))
+
+    def next_rows(self, calls):
+        """Returns a list of (subject_identifier, next scheduled date) for a list of
+        (pk, subject_identifier, scheduled, call_datetime) rows.
+
+        Rows without a next date, or with a next date not after the call's scheduled
+        date, are skipped."""
+        next_dates = self.model_caller.get_next_scheduled_dates(
+            [call_datetime or scheduled for _, _, scheduled, call_datetime in calls])
+        rows = []
+        for (_, subject_identifier, scheduled, _), next_date in zip(calls, next_dates):
+            if next_date and next_date > scheduled:
+                rows.append((subject_identifier, next_date))
+            else:
+                self.skipped += 1
+        return rows
+
+    def rollover(self, dry_run=False):
+        """Creates the next call for each call in `queryset`, one chunk per transaction,
+        and returns the number of calls created, or found if `dry_run`."""
+        if not self.model_caller.repeats or not self.model_caller.interval:
+            self.write(f'Model caller \'{self.model_caller.label}\' does not repeat on an interval.')
+            return 0
+        scheduler = BulkCallScheduler(self.model_caller, chunk_size=self.chunk_size)
+        start = time.perf_counter()
+        last_pk = None
+        while True:
+            queryset = self.queryset.order_by('pk')
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            calls = list(queryset.values_list(
+                'pk', 'subject_identifier', 'scheduled', 'call_datetime')[:self.chunk_size])
+            if not calls:
+                break
+            last_pk = calls[-1][0]
+            rows = self.next_rows(calls)
+            if dry_run:
+                self.created += len(rows)
+            else:
+                self.created += len(scheduler.create_calls(rows))
+            elapsed = time.perf_counter() - start
+            self.write(f'  {self.created} calls rolled over ({self.created / elapsed if elapsed else 0:.0f} calls/s)')
+        self.skipped += scheduler.skipped
+        return self.created
+
+    def write(self, msg):
+        if self.stdout:
+            self.stdout.write(msg)
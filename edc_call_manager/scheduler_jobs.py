@@ -0,0 +1,209 @@
+import socket
+import threading
+import time
+
+from datetime import timedelta
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import F, Q
+
+from edc_base.utils import get_utcnow
+
+from .bulk_scheduler import BulkCallScheduler
+from .constants import ROLLOVER, SCHEDULE, UNSCHEDULE
+from .constants import DONE_JOB, FAILED_JOB, PENDING_JOB, RUNNING_JOB
+from .utils import chunked
+
+
+def get_job_model():
+    return django_apps.get_model('edc_call_manager', 'schedulerjob')
+
+
+def enqueue_schedule(model_caller, instance):
+    """Adds a job to schedule a call for a start model instance."""
+    return get_job_model().objects.create(
+        job_type=SCHEDULE,
+        label=model_caller.label,
+        subject_identifier=instance.subject_identifier,
+        scheduled=getattr(instance, 'initial_call_date', None))
+
+
+def enqueue_unschedule(model_caller, subject_identifier):
+    """Adds a job to close open calls for this subject and model caller."""
+    return get_job_model().objects.create(
+        job_type=UNSCHEDULE,
+        label=model_caller.label,
+        subject_identifier=subject_identifier)
+
+
+def enqueue_rollover(model_caller, call):
+    """Adds a job to schedule the next call after a closed call."""
+    return get_job_model().objects.create(
+        job_type=ROLLOVER,
+        label=model_caller.label,
+        subject_identifier=call.subject_identifier,
+        call_pk=str(call.pk))
+
+
+def enqueue_schedules(model_caller, rows, batch_size=1000):
+    """Adds schedule jobs for a list of (subject_identifier, scheduled) rows with
+    `bulk_create` and returns the number added.
+
+    Subjects with a pending or running schedule job for the model caller are skipped,
+    so enqueueing the same subjects again does not add a second job."""
+    job_model = get_job_model()
+    jobs = []
+    for chunk in chunked(rows, batch_size):
+        queued = set(job_model.objects.filter(
+            job_type=SCHEDULE,
+            label=model_caller.label,
+            status__in=[PENDING_JOB, RUNNING_JOB],
+            subject_identifier__in=[subject_identifier for subject_identifier, _ in chunk]).values_list(
+                'subject_identifier', flat=True))
+        for subject_identifier, scheduled in chunk:
+            if subject_identifier not in queued:
+                queued.add(subject_identifier)
+                jobs.append(job_model(job_type=SCHEDULE, label=model_caller.label,
+                                      subject_identifier=subject_identifier, scheduled=scheduled))
+    job_model.objects.bulk_create(jobs, batch_size=batch_size)
+    return len(jobs)
+
+
+class SchedulerWorker:
+    """A worker that claims pending scheduler jobs and runs them.
+
+    Jobs are claimed in batches with `SELECT ... FOR UPDATE SKIP LOCKED` so that any
+    number of workers, in threads or on other hosts, can share the job table. Jobs of
+    the same type and model caller in a batch are run together with the bulk methods.
+    Running a job again, e.g. a stale job that had committed, does not schedule a
+    second call. A failed job is retried with exponential backoff until
+    `max_attempts`; a schedule job for a subject without a consent fails without a
+    retry. Jobs left running by a worker that died are claimed again after
+    `stale_after`.
+    """
+
+    batch_size = 100
+    backoff = timedelta(seconds=30)
+    max_attempts = 5
+    stale_after = timedelta(minutes=15)
+
+    def __init__(self, name=None, batch_size=None, max_attempts=None, site=None):
+        if not site:
+            from .caller_site import site_model_callers as site
+        self.site = site
+        self.name = name or f'{socket.gethostname()}-{threading.get_ident()}'
+        self.batch_size = batch_size or self.batch_size
+        self.max_attempts = max_attempts or self.max_attempts
+        self.job_model = get_job_model()
+        self.done = 0
+        self.failed = 0
+
+    def claim(self):
+        """Claims and returns a list of up to `batch_size` jobs."""
+        now = get_utcnow()
+        available = Q(status=PENDING_JOB, available_datetime__lte=now)
+        stale = Q(status=RUNNING_JOB, locked_datetime__lt=now - self.stale_after)
+        with transaction.atomic():
+            jobs = list(
+                self.job_model.objects.select_for_update(skip_locked=True).filter(
+                    available | stale).order_by('available_datetime')[:self.batch_size])
+            if jobs:
+                self.job_model.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                    status=RUNNING_JOB,
+                    locked_by=self.name,
+                    locked_datetime=now,
+                    attempts=F('attempts') + 1)
+        for job in jobs:
+            job.attempts += 1
+        return jobs
+
+    def run_once(self):
+        """Claims and runs one batch of jobs and returns the number of jobs claimed."""
+        jobs = self.claim()
+        groups = {}
+        for job in jobs:
+            groups.setdefault((job.job_type, job.label), []).append(job)
+        for (job_type, label), group in groups.items():
+            try:
+                errors = self.run_jobs(job_type, label, group)
+            except Exception:
+                for job in group:
+                    try:
+                        errors = self.run_jobs(job_type, label, [job])
+                    except Exception as e:
+                        self.job_failed(job, e)
+                    else:
+                        self.jobs_finished([job], errors)
+            else:
+                self.jobs_finished(group, errors)
+        return len(jobs)
+
+    def run_jobs(self, job_type, label, jobs):
+        """Runs jobs of one type and model caller and returns a dictionary of the
+        error by job pk of jobs that cannot succeed if retried, e.g. a subject without
+        a consent."""
+        model_caller = self.site.get_model_caller(label)
+        if not model_caller:
+            raise LookupError(f'Unknown model caller. Got {label}.')
+        errors = {}
+        with transaction.atomic():
+            if job_type == SCHEDULE:
+                scheduler = BulkCallScheduler(model_caller)
+                scheduler.create_calls([(job.subject_identifier, job.scheduled) for job in jobs])
+                not_consented = set(scheduler.not_consented)
+                for job in jobs:
+                    if job.subject_identifier in not_consented:
+                        # as raised by ModelCaller.consent when scheduling synchronously.
+                        errors[job.pk] = ValueError(
+                            'ModelCaller \'{}\' is configured to require a consent for subject \'{}\'.'.format(
+                                label, job.subject_identifier))
+            elif job_type == UNSCHEDULE:
+                model_caller.bulk_unschedule_calls([job.subject_identifier for job in jobs])
+            elif job_type == ROLLOVER:
+                for job in jobs:
+                    call = model_caller.call_model.objects.get(pk=job.call_pk)
+                    # a job run again after its transaction committed finds the next call.
+                    later_calls = model_caller.call_model.objects.filter(
+                        subject_identifier=call.subject_identifier,
+                        label=call.label,
+                        scheduled__gt=call.scheduled)
+                    if not later_calls.exists():
+                        model_caller.schedule_next_call(call)
+            else:
+                raise ValueError(f'Unknown job type. Got {job_type}.')
+        return errors
+
+    def jobs_finished(self, jobs, errors):
+        """Marks jobs done, or failed without a retry if in `errors`."""
+        for job in jobs:
+            if job.pk in errors:
+                self.job_failed(job, errors[job.pk], retry=False)
+        self.jobs_done([job for job in jobs if job.pk not in errors])
+
+    def jobs_done(self, jobs):
+        if not jobs:
+            return
+        self.job_model.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=DONE_JOB, completed_datetime=get_utcnow(), last_error=None)
+        self.done += len(jobs)
+
+    def job_failed(self, job, e, retry=True):
+        if not retry or job.attempts >= self.max_attempts:
+            status, available_datetime = FAILED_JOB, job.available_datetime
+            self.failed += 1
+        else:
+            status = PENDING_JOB
+            available_datetime = get_utcnow() + self.backoff * 2 ** (job.attempts - 1)
+        self.job_model.objects.filter(pk=job.pk).update(
+            status=status,
+            available_datetime=available_datetime,
+            last_error=f'{e.__class__.__name__}: {e}')
+
+    def run(self, poll_interval=1.0, stop_event=None, once=False):
+        """Runs batches until stopped, or until no jobs are available if `once`."""
+        while not (stop_event and stop_event.is_set()):
+            if not self.run_once():
+                if once:
+                    break
+                time.sleep(poll_interval)
@@ -0,0 +1,106 @@
+import logging
+import threading
+
+from django.db import transaction
+
+from .bulk_scheduler import BulkCallScheduler
+from .constants import SCHEDULE, UNSCHEDULE
+
+logger = logging.getLogger('edc_call_manager.scheduling_queue')
+
+
+class SchedulingBatch:
+    """The coalesced schedule and unschedule intents of one transaction or savepoint."""
+
+    def __init__(self, queue, key):
+        self.queue = queue
+        self.key = key
+        self.intents = {}
+
+    def add(self, action, model_caller, subject_identifier, scheduled=None):
+        key = (action, model_caller.label)
+        if key not in self.intents:
+            self.intents[key] = (model_caller, {})
+        self.intents[key][1].setdefault(subject_identifier, scheduled)
+
+    def flush(self):
+        """Schedules then unschedules the calls in this batch, one batched
+        operation per model caller.
+
+        Subjects without a consent, for which `ModelCaller.schedule_call` raises a
+        ValueError, are logged as an error instead, as the transaction has committed
+        and raising would also lose the on_commit callbacks after this one."""
+        self.queue.discard(self)
+        for (action, _), (model_caller, subjects) in sorted(self.intents.items(), key=lambda item: item[0]):
+            if action == SCHEDULE:
+                scheduler = BulkCallScheduler(model_caller)
+                scheduler.create_calls(list(subjects.items()))
+                if scheduler.not_consented:
+                    logger.error(
+                        'ModelCaller \'%s\' is configured to require a consent. Not scheduled '
+                        'for subjects without a consent. Got %s.', model_caller.label, scheduler.not_consented)
+            elif action == UNSCHEDULE:
+                model_caller.bulk_unschedule_calls(list(subjects))
+
+
+class SchedulingQueue:
+    """A queue of schedule and unschedule intents that is flushed once the current
+    transaction commits.
+
+    Used by model callers with `defer_scheduling = True`. Intents are coalesced per
+    action, model caller label and subject_identifier; schedules are flushed before
+    unschedules. There is one batch per database alias and savepoint, each flushed by
+    its own `on_commit` callback, so if a savepoint or the transaction rolls back,
+    Django discards the callback and the intents with it.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def batches(self):
+        """Returns the pending batch per (database alias, savepoint ids) for this thread."""
+        try:
+            return self._local.batches
+        except AttributeError:
+            self._local.batches = {}
+            return self._local.batches
+
+    def schedule(self, model_caller, instance, using=None):
+        """Queues a call to be scheduled for a start model instance."""
+        self.enqueue(
+            SCHEDULE, model_caller, instance.subject_identifier,
+            scheduled=getattr(instance, 'initial_call_date', None), using=using)
+
+    def unschedule(self, model_caller, subject_identifier, using=None):
+        """Queues open calls for this subject and model caller to be closed."""
+        self.enqueue(UNSCHEDULE, model_caller, subject_identifier, using=using)
+
+    def enqueue(self, action, model_caller, subject_identifier, scheduled=None, using=None):
+        connection = transaction.get_connection(using)
+        key = (connection.alias, tuple(connection.savepoint_ids))
+        batch = self.batches.get(key)
+        if batch and self.is_pending(connection, batch):
+            batch.add(action, model_caller, subject_identifier, scheduled)
+        else:
+            # forget batches of this alias that were flushed or rolled back.
+            for other_key, other in list(self.batches.items()):
+                if other_key[0] == connection.alias and not self.is_pending(connection, other):
+                    del self.batches[other_key]
+            batch = SchedulingBatch(self, key)
+            self.batches[key] = batch
+            batch.add(action, model_caller, subject_identifier, scheduled)
+            # in autocommit mode on_commit flushes immediately, so add first.
+            transaction.on_commit(batch.flush, using=connection.alias)
+
+    def is_pending(self, connection, batch):
+        """Returns True if the batch is still waiting on its transaction, that is,
+        it has not been flushed or discarded by a rollback."""
+        return any(entry[1] == batch.flush for entry in connection.run_on_commit)
+
+    def discard(self, batch):
+        if self.batches.get(batch.key) is batch:
+            del self.batches[batch.key]
+
+
+scheduling_queue = SchedulingQueue()
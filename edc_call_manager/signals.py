@@ -1,12 +1,25 @@
-from django.db.models.signals import post_save
-from django.dispatch.dispatcher import receiver
+from django.db.models.signals import post_delete, post_save, pre_save
 
 from edc_constants.constants import CLOSED
 
+from .call_summary import call_deleted, call_saved, call_saving
 from .caller_site import site_model_callers
+from .instrumentation import instrumented
 
 
-@receiver(post_save, weak=False, dispatch_uid='edc_call_manager_model_caller_on_post_save')
+def sender_label(args, kwargs, result):
+    return kwargs['sender']._meta.label_lower
+
+
+def call_label(args, kwargs, result):
+    return kwargs['instance'].label
+
+
+def log_entry_call_label(args, kwargs, result):
+    return kwargs['instance'].log.call.label
+
+
+@instrumented('model_caller_on_post_save', label=sender_label)
 def edc_call_manager_model_caller_on_post_save(sender, instance, raw, created, using, update_fields, **kwargs):
     """A signal that acts on start and stop models on create."""
     if not raw and created:
@@ -14,32 +27,65 @@ def edc_call_manager_model_caller_on_post_save(sender, instance, raw, created, u
         site_model_callers.unschedule_calls(sender, instance)
 
 
-@receiver(post_save, weak=False, dispatch_uid='edc_call_manager_call_on_post_save')
+@instrumented('call_on_post_save', label=call_label)
 def edc_call_manager_call_on_post_save(sender, instance, raw, created, using, update_fields, **kwargs):
     """A signal that acts on the Call model and schedules a new call if the current one is closed
     and configured to repeat on the model_caller."""
     if not raw and not created:
-        try:
-            site_model_callers.unschedule_calls(sender, instance)
-            if instance.call_status == CLOSED:
-                site_model_callers.schedule_next_call(instance)
-        except AttributeError as e:
-            if 'has no attribute \'call_status\'' not in str(e):
-                raise AttributeError(e)
+        site_model_callers.unschedule_calls(sender, instance)
+        if instance.call_status == CLOSED:
+            site_model_callers.schedule_next_call(instance)
 
 
-@receiver(post_save, weak=False, dispatch_uid='edc_call_manager_log_entry_on_post_save')
+@instrumented('log_entry_on_post_save', label=log_entry_call_label)
 def edc_call_manager_log_entry_on_post_save(sender, instance, raw, created, using, **kwargs):
     """Updates call after a log entry ('call_status', 'call_attempts', 'call_outcome')."""
 
     if not raw:
-        try:
-            site_model_callers.update_call_from_log(
+        site_model_callers.update_call_from_log(
+            instance.log.call, log_entry=instance)
+        model_caller = site_model_callers.get_model_caller(sender)
+        if model_caller:
+            model_caller.appointment_handler(
                 instance.log.call, log_entry=instance)
-            model_caller = site_model_callers.get_model_caller(sender)
-            if model_caller:
-                model_caller.appointment_handler(
-                    instance.log.call, log_entry=instance)
-        except AttributeError as e:
-            if 'has no attribute \'log\'' not in str(e):
-                raise AttributeError(e)
+
+
+def edc_call_manager_call_summary_on_pre_save(sender, instance, raw, using, **kwargs):
+    call_saving(instance, raw, using=using)
+
+
+def edc_call_manager_call_summary_on_post_save(sender, instance, raw, created, using, **kwargs):
+    """Updates the CallSummary counts when a call is created, closed or rescheduled."""
+    call_saved(instance, created, using=using)
+
+
+def edc_call_manager_call_summary_on_post_delete(sender, instance, using, **kwargs):
+    call_deleted(instance, using=using)
+
+
+def connect_model_caller_signals(model_caller):
+    """Connects the post_save receivers to the models of a registered model caller only
+    and returns a list of (signal, sender, dispatch_uid) for `disconnect_signals`.
+
+    Saving any other model does not reach the call manager receivers."""
+    receivers = [
+        (post_save, edc_call_manager_model_caller_on_post_save, model_caller.start_model),
+        (post_save, edc_call_manager_model_caller_on_post_save, model_caller.stop_model),
+        (post_save, edc_call_manager_call_on_post_save, model_caller.call_model),
+        (pre_save, edc_call_manager_call_summary_on_pre_save, model_caller.call_model),
+        (post_save, edc_call_manager_call_summary_on_post_save, model_caller.call_model),
+        (post_delete, edc_call_manager_call_summary_on_post_delete, model_caller.call_model),
+        (post_save, edc_call_manager_log_entry_on_post_save, model_caller.log_entry_model)]
+    connected = []
+    for signal, receiver, sender in receivers:
+        if sender:
+            dispatch_uid = f'{receiver.__name__}_{sender._meta.label_lower}'
+            signal.connect(receiver, sender=sender, weak=False, dispatch_uid=dispatch_uid)
+            connected.append((signal, sender, dispatch_uid))
+    return connected
+
+
+def disconnect_signals(connected):
+    """Disconnects receivers connected by `connect_model_caller_signals`."""
+    for signal, sender, dispatch_uid in connected:
+        signal.disconnect(sender=sender, dispatch_uid=dispatch_uid)
@@ -0,0 +1,52 @@
+import os
+import re
+import subprocess
+import sys
+
+from django.apps import apps as django_apps
+
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\S.*)$')
+
+
+def parse_importtime(lines, top_level=True):
+    """Returns a dictionary of microseconds by top level package, or by module if not
+    `top_level`, from the output of `python -X importtime`, summing the self time of
+    each module."""
+    totals = {}
+    for line in lines:
+        match = IMPORTTIME_PATTERN.match(line.rstrip())
+        if match:
+            name = match.group(3).strip()
+            if top_level:
+                name = name.split('.')[0]
+            totals[name] = totals.get(name, 0) + int(match.group(1))
+    return totals
+
+
+def get_app_name(module_name, app_names):
+    """Returns the app name that is the longest module prefix of `module_name`, or None."""
+    matches = [name for name in app_names if module_name == name or module_name.startswith(name + '.')]
+    return max(matches, key=len) if matches else None
+
+
+def import_times_by_app(settings_module=None):
+    """Returns a list of (app name, seconds) for the time spent importing each
+    installed app's modules during `django.setup()`, slowest first.
+
+    Runs `django.setup()` in a new interpreter with `-X importtime` so modules
+    already imported by this process are counted. Each module is counted for the
+    app with the longest matching module prefix, so `django.contrib.auth.models`
+    is counted for 'django.contrib.auth' and modules of no app as '(other)'."""
+    env = dict(os.environ)
+    if settings_module:
+        env['DJANGO_SETTINGS_MODULE'] = settings_module
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import django; django.setup()'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    app_names = [app_config.name for app_config in django_apps.get_app_configs()]
+    totals = dict.fromkeys(app_names + ['(other)'], 0)
+    for module_name, microseconds in parse_importtime(completed.stderr.splitlines(), top_level=False).items():
+        totals[get_app_name(module_name, app_names) or '(other)'] += microseconds
+    return sorted(
+        [(name, microseconds / 1000000) for name, microseconds in totals.items()],
+        key=lambda row: row[1], reverse=True)
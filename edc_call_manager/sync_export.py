@@ -0,0 +1,164 @@
+import gzip
+import json
+import os
+
+from datetime import timedelta
+from itertools import groupby
+
+from django.apps import apps as django_apps
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django_crypto_fields.fields import BaseField
+
+from edc_base.utils import get_utcnow
+
+# (model, select_related, [(path to parent, parent model), ...]), parents first.
+SYNC_MODELS = [
+    ('edc_call_manager.call', [], []),
+    ('edc_call_manager.log', ['call'], [('call', 'edc_call_manager.call')]),
+    ('edc_call_manager.logentry', ['log__call'], [
+        ('log__call', 'edc_call_manager.call'), ('log', 'edc_call_manager.log')]),
+]
+
+# personal details that are not encrypted but, as in CallExport, are not exported.
+EXCLUDED_FIELDS = ['initials']
+
+
+def get_watermark_model():
+    return django_apps.get_model('edc_call_manager', 'syncwatermark')
+
+
+def get_sync_fields(model):
+    """Returns the names of the fields of a model to export.
+
+    Encrypted fields are decrypted when a row is loaded, so they are left out with
+    the other EXCLUDED_FIELDS rather than written to the file as plaintext."""
+    return [field.name for field in model._meta.concrete_fields if not (
+        field.primary_key or isinstance(field, BaseField) or field.name in EXCLUDED_FIELDS)]
+
+
+class ChangedSinceExport:
+    """Exports the calls, logs and log entries changed since the last export to a
+    destination as gzipped JSON batch files.
+
+    A watermark of the (modified, id) of the last row exported is kept per
+    destination and model. Rows after the watermark are read in (modified, id)
+    keyset order, `batch_size` rows per file. Models are exported call, log then
+    log entry, so a file only refers by natural key to rows already exported. The
+    watermark moves forward after each file is written, so an interrupted export
+    resumes after the last complete file.
+
+    Rows modified in the last `lag` are left for the next export, so a row saved
+    by a transaction that has not yet committed is not passed by the watermark.
+    This holds for transactions shorter than `lag`: a row committed later than
+    `lag` after its modified time is behind the watermark and is not exported
+    unless saved again. The bulk scheduler and rollover commit one chunk per
+    transaction, well within the default. Rows loaded by BulkLoader keep the
+    modified time of the device they came from and are not exported again.
+
+    The parents of each batch of logs or log entries that may not have been
+    exported yet, that is, modified since the parent model's watermark, are
+    written to the same file before the batch, so a file never refers to a call or
+    log its destination has not received.
+
+    Encrypted fields, i.e. names, locator information and contact notes, and
+    initials are not exported; see `get_sync_fields`.
+
+    For example:
+
+        files = ChangedSinceExport('clinic-device-01', output_dir='/tmp/sync').export()
+    """
+
+    batch_size = 5000
+    lag = timedelta(minutes=5)
+
+    def __init__(self, destination, output_dir=None, batch_size=None, lag=None, stdout=None):
+        self.destination = destination
+        self.output_dir = output_dir or '.'
+        self.batch_size = batch_size or self.batch_size
+        self.lag = self.lag if lag is None else lag
+        self.stdout = stdout
+        self.watermark_model = get_watermark_model()
+
+    def get_watermark(self, model):
+        watermark, _ = self.watermark_model.objects.get_or_create(
+            destination=self.destination, model=model._meta.label_lower)
+        return watermark
+
+    def changed(self, model, select_related, watermark, until):
+        """Returns the next batch of rows changed after the watermark."""
+        queryset = model.objects.select_related(*select_related).filter(modified__lt=until)
+        if watermark.last_modified:
+            after = Q(modified__gt=watermark.last_modified)
+            same_modified = Q(modified=watermark.last_modified, id__gt=watermark.last_pk)
+            queryset = queryset.filter(after | same_modified)
+        return list(queryset.order_by('modified', 'id')[:self.batch_size])
+
+    def export(self):
+        """Writes a file per batch of changed rows and returns the list of file paths."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        until = get_utcnow() - self.lag
+        timestamp = until.strftime('%Y%m%d%H%M%S')
+        paths = []
+        watermarks = {}
+        for label_lower, select_related, parents in SYNC_MODELS:
+            model = django_apps.get_model(label_lower)
+            watermark = self.get_watermark(model)
+            sequence = 0
+            while True:
+                rows = self.changed(model, select_related, watermark, until)
+                if not rows:
+                    break
+                sequence += 1
+                path = os.path.join(
+                    self.output_dir,
+                    f'{self.destination}-{timestamp}-{model._meta.model_name}-{sequence:05d}.json.gz')
+                self.write_batch(path, self.get_parents(rows, parents, watermarks) + rows)
+                with transaction.atomic():
+                    watermark.last_modified = rows[-1].modified
+                    watermark.last_pk = str(rows[-1].pk)
+                    watermark.save(update_fields=['last_modified', 'last_pk', 'modified'])
+                paths.append(path)
+                self.write(f'  {path}: {len(rows)} {model._meta.verbose_name_plural}')
+            watermarks[label_lower] = watermark
+        return paths
+
+    def get_parents(self, rows, parents, watermarks):
+        """Returns the parents of rows, parents first, that were modified since the
+        watermark of their model."""
+        parent_rows = []
+        for path, parent_label in parents:
+            last_modified = watermarks[parent_label].last_modified
+            seen = set()
+            for row in rows:
+                parent = row
+                for attr in path.split('__'):
+                    parent = getattr(parent, attr)
+                if parent.pk not in seen and (not last_modified or parent.modified >= last_modified):
+                    seen.add(parent.pk)
+                    parent_rows.append(parent)
+        return parent_rows
+
+    def write_batch(self, path, rows):
+        """Writes rows to a gzipped JSON file with natural foreign keys, via a temporary
+        file so a partial file is never left at `path`.
+
+        Rows are serialized a model at a time, as parents come before the rows of the batch."""
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            objects = []
+            for model, group in groupby(rows, key=type):
+                objects.extend(serializers.serialize(
+                    'python', group, fields=get_sync_fields(model), use_natural_foreign_keys=True))
+            json.dump(objects, f, cls=DjangoJSONEncoder)
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        """Deletes the watermarks for this destination so the next export is complete."""
+        return self.watermark_model.objects.filter(destination=self.destination).delete()[0]
+
+    def write(self, msg):
+        if self.stdout:
+            self.stdout.write(msg)
@@ -0,0 +1,136 @@
+import gzip
+import json
+
+from django.apps import apps as django_apps
+from django.core import serializers
+from django.core.serializers.base import DeserializationError
+from django.db import transaction
+
+from .call_summary import update_call_summary
+from .model_mixins import CallModelMixin
+
+
+class BulkLoader:
+    """Loads serialized calls, logs and log entries, e.g. the files written by
+    ChangedSinceExport, with a few set-based queries per batch.
+
+    The natural foreign keys of a batch are collected and resolved with the related
+    manager's `get_by_natural_keys`, the rows are deserialized against the resolved
+    primary keys and then written with `bulk_create` or `bulk_update`, depending on
+    whether the primary key exists. The rows loaded are the same as those of
+    `loaddata`, which resolves each natural key with its own query.
+
+    Rows must have a primary key. Existing rows are updated with the fields in the
+    file only. Model signals are not sent; CallSummary is updated directly for the
+    calls loaded.
+
+    For example:
+
+        BulkLoader(batch_size=5000).load_file('clinic-device-01-...-logentry-00001.json.gz')
+    """
+
+    batch_size = 5000
+
+    def __init__(self, using=None, batch_size=None, stdout=None):
+        self.using = using
+        self.batch_size = batch_size or self.batch_size
+        self.stdout = stdout
+        self.created = 0
+        self.updated = 0
+
+    def load_file(self, path):
+        """Loads a JSON file, gzipped if the name ends with '.gz'."""
+        open_file = gzip.open if path.endswith('.gz') else open
+        with open_file(path, 'rt', encoding='utf-8') as f:
+            return self.load(json.load(f))
+
+    def load(self, objects):
+        """Loads a list of serialized objects in the format of the 'python' and 'json'
+        serializers, batch by batch in the order given, and returns the number of
+        objects loaded."""
+        loaded = 0
+        for index in range(0, len(objects), self.batch_size):
+            batch = objects[index:index + self.batch_size]
+            by_model = {}
+            for obj in batch:
+                by_model.setdefault(obj['model'], []).append(obj)
+            with transaction.atomic(using=self.using):
+                for label_lower, model_objects in by_model.items():
+                    loaded += self.load_batch(django_apps.get_model(label_lower), model_objects)
+        return loaded
+
+    def load_batch(self, model, objects):
+        """Creates or updates the instances of a batch of serialized objects of one model."""
+        if any(obj.get('pk') is None for obj in objects):
+            raise DeserializationError(
+                f'Expected a primary key for each {model._meta.label_lower} object.')
+        objects = self.resolve_foreign_keys(model, objects)
+        instances = [
+            deserialized.object for deserialized in serializers.deserialize(
+                'python', objects, using=self.using, ignorenonexistent=True)]
+        existing = self.get_existing(model, [instance.pk for instance in instances])
+        created = [instance for instance in instances if instance.pk not in existing]
+        updated = [instance for instance in instances if instance.pk in existing]
+        manager = model._base_manager.db_manager(self.using)
+        manager.bulk_create(created)
+        if updated:
+            # only the fields in the file, e.g. not the encrypted fields left out by ChangedSinceExport.
+            names = {name for obj in objects for name in obj['fields']}
+            fields = [field.name for field in model._meta.concrete_fields
+                      if not field.primary_key and field.name in names]
+            manager.bulk_update(updated, fields)
+        if issubclass(model, CallModelMixin):
+            self.update_call_summary(instances, existing)
+        self.created += len(created)
+        self.updated += len(updated)
+        self.write(f'  {model._meta.label_lower}: {len(created)} created, {len(updated)} updated')
+        return len(instances)
+
+    def resolve_foreign_keys(self, model, objects):
+        """Returns the objects with each natural foreign key replaced by the primary
+        key of the related instance, resolved with one `get_by_natural_keys` per field."""
+        objects = [dict(obj, fields=dict(obj['fields'])) for obj in objects]
+        for field in model._meta.concrete_fields:
+            if not field.is_relation:
+                continue
+            manager = field.related_model._default_manager.db_manager(self.using)
+            natural_keys = [
+                obj['fields'][field.name] for obj in objects
+                if isinstance(obj['fields'].get(field.name), (list, tuple))]
+            if not natural_keys or not hasattr(manager, 'get_by_natural_keys'):
+                continue
+            instances = manager.get_by_natural_keys(natural_keys)
+            for obj in objects:
+                natural_key = obj['fields'].get(field.name)
+                if not isinstance(natural_key, (list, tuple)):
+                    continue
+                try:
+                    related = instances[manager.to_natural_key(natural_key)]
+                except KeyError:
+                    raise DeserializationError(
+                        f'{field.related_model._meta.label_lower} matching natural key '
+                        f'{natural_key} does not exist.')
+                obj['fields'][field.name] = getattr(related, field.target_field.attname)
+        return objects
+
+    def get_existing(self, model, pks):
+        """Returns a dictionary of the call summary key, or None, by primary key of the
+        instances that exist."""
+        queryset = model._base_manager.using(self.using).filter(pk__in=pks)
+        if issubclass(model, CallModelMixin):
+            return {pk: (label, call_status, scheduled) for pk, label, call_status, scheduled in
+                    queryset.values_list('pk', 'label', 'call_status', 'scheduled')}
+        return {pk: None for pk in queryset.values_list('pk', flat=True)}
+
+    def update_call_summary(self, calls, existing):
+        deltas = {}
+        for call in calls:
+            key = (call.label, call.call_status, call.scheduled)
+            deltas[key] = deltas.get(key, 0) + 1
+            if call.pk in existing:
+                deltas[existing[call.pk]] = deltas.get(existing[call.pk], 0) - 1
+        update_call_summary(deltas, using=self.using)
+
+    def write(self, msg):
+        if self.stdout:
+            self.stdout.write(msg)
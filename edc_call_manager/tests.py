@@ -1,19 +1,54 @@
+import gzip
+import hashlib
 import json
+import os
+import tempfile
+import threading
 
 from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+from uuid import uuid4
 
 from django.apps import apps as django_apps
+from django.contrib.auth.models import User
 from django.core import serializers
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test.client import RequestFactory
 from django.test.testcases import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls.base import reverse
 
 from edc_base.utils import get_utcnow
 from edc_constants.constants import CLOSED, YES, NO, ALIVE, DEAD
 from edc_registration.models import RegisteredSubject
-from example.models import TestModel, TestStartModel, TestStopModel, TestStopTwoModel, Locator
+from example.models import (
+    CallLogLocator, SubjectConsent, TestModel, TestStartModel, TestStopModel, TestStopTwoModel, Locator)
 
-from .caller_site import site_model_callers, AlreadyRegistered
-from .constants import OPEN_CALL, NEW_CALL
-from .model_caller import ModelCaller, WEEKLY
+from .admin import CallAdmin
+from .admin_site import edc_call_manager_admin
+from .benchmarks import benchmark_get_model_caller, benchmark_post_save_dispatch, CallManagerBenchmark
+from .bulk_scheduler import BulkCallScheduler
+from .call_summary import get_call_figures, reconcile_call_summary
+from .caller_site import site_model_callers, AlreadyRegistered, CallerSite
+from .claims import CallClaim
+from .constants import OPEN_CALL, NEW_CALL, DONE_JOB, FAILED_JOB, PENDING_JOB, ROLLOVER, SCHEDULE
+from .export import CallExport, JSONL
+from .instrumentation import instrumentation, metrics_text, RegistrySink
+from .model_caller import ModelCaller, WEEKLY, YEARLY
+from .models import CallSummary, SchedulerJob
+from .rollover import CallRollover
+from .scheduler_jobs import SchedulerWorker
+from .startup import get_app_name, parse_importtime
+from .sync_export import ChangedSinceExport
+from .sync_load import BulkLoader
+from .forms import LogEntryForm
+from .views import CallSubjectCreateView
+from .worklist import DueCallWorklist
 
 Call = django_apps.get_model('edc_call_manager', 'call')
 Log = django_apps.get_model('edc_call_manager', 'log')
@@ -43,6 +78,30 @@ class LocatorTestModelCaller(ModelCaller):
     subject_model = RegisteredSubject
 
 
+class ConsentTestModelCaller(ModelCaller):
+    label = 'ConsentTestModelCaller'
+    app_label = 'edc_call_manager_example'
+    consent_model = SubjectConsent
+    locator_model = Locator
+    subject_model = RegisteredSubject
+
+
+class DeferredTestModelCaller(ModelCaller):
+    label = 'DeferredTestModelCaller'
+    app_label = 'edc_call_manager_example'
+    locator_model = Locator
+    subject_model = RegisteredSubject
+    defer_scheduling = True
+
+
+class QueuedTestModelCaller(ModelCaller):
+    label = 'QueuedTestModelCaller'
+    app_label = 'edc_call_manager_example'
+    locator_model = Locator
+    subject_model = RegisteredSubject
+    enqueue_jobs = True
+
+
 class TestCallManager(TestCase):
 
     def setUp(self):
@@ -76,6 +135,107 @@ class TestCallManager(TestCase):
         self.assertIn(TestModel, site_model_callers.start_models)
         self.assertIn(TestStartModel, site_model_callers.start_models)
 
+    def test_get_model_caller(self):
+        """Test that a model caller is found by start model, model label, tuple or caller label.
+        """
+        model_caller = site_model_callers.start_models[TestStartModel]
+        for param in [TestStartModel, 'example.teststartmodel', 'example.TestStartModel',
+                      ('example', 'TestStartModel'), 'repeatingtestmodelcaller', 'RepeatingTestModelCaller']:
+            self.assertIs(site_model_callers.get_model_caller(param), model_caller)
+        self.assertIsNone(site_model_callers.get_model_caller(LogEntry))
+        self.assertIsNone(site_model_callers.get_model_caller('example.teststopmodel'))
+        results = benchmark_get_model_caller(site_model_callers, [TestStartModel, LogEntry], number=100)
+        self.assertEqual(set(results), {'before', 'after'})
+
+    def test_registry_json_cached_until_registry_changes(self):
+        """Test that the registry JSON is computed once and recomputed after a register.
+        """
+        registry_json = site_model_callers.registry_json
+        self.assertIs(site_model_callers.registry_json, registry_json)
+        self.assertEqual(
+            [model_caller['label'] for model_caller in json.loads(registry_json)['model_callers']],
+            ['testmodelcaller', 'repeatingtestmodelcaller'])
+        site_model_callers.register(LocatorTestModelCaller, Locator, verbose=False)
+        self.assertEqual(len(json.loads(site_model_callers.registry_json)['model_callers']), 3)
+
+    def test_lazy_autodiscover_on_first_save(self):
+        """Test that lazy autodiscovery imports nothing until the first model save.
+        """
+        site = CallerSite()
+        site.autodiscover_lazily()
+        self.assertEqual(site.autodiscover_times, {})
+        TestModel.objects.create(subject_identifier='2222222')
+        self.assertIn('example', site.autodiscover_times)
+        self.assertIsNone(site._pending_autodiscover)
+        self.assertEqual([row[0] for row in site.autodiscover_report()], list(site.autodiscover_times))
+
+    def test_autodiscover_import_error_restores_registry_and_signals(self):
+        """Test that a model_callers module that fails to import leaves no registration or receiver behind.
+        """
+        def failing_import(name):
+            site.register(RepeatingTestModelCaller, TestStartModel, TestStopModel, verbose=False)
+            raise ImportError(name)
+
+        site_model_callers.reset_registry()
+        site = CallerSite()
+        site.register(TestModelCaller, TestModel, TestStopModel, verbose=False)
+        connected = list(site._connected_signals)
+        with patch('edc_call_manager.caller_site.import_module', side_effect=failing_import):
+            self.assertRaises(ImportError, site.autodiscover)
+        self.assertEqual(site.stop_models, {TestStopModel: [TestModel]})
+        self.assertEqual(list(site.start_models), [TestModel])
+        self.assertEqual(site._connected_signals, connected)
+        dispatch_uids = [receiver[0][0] for receiver in post_save.receivers]
+        self.assertNotIn('edc_call_manager_model_caller_on_post_save_example.teststartmodel', dispatch_uids)
+        self.assertIn('edc_call_manager_model_caller_on_post_save_example.testmodel', dispatch_uids)
+        self.assertIn('edc_call_manager_call_on_post_save_edc_call_manager.call', dispatch_uids)
+        site.reset_registry()
+
+    def test_lazy_autodiscover_other_threads_wait(self):
+        """Test that other threads wait for lazy autodiscovery to complete and that it
+        runs once.
+        """
+        site = CallerSite()
+        site.autodiscover_lazily()
+        autodiscover = site.autodiscover
+        seen = {}
+
+        def autodiscover_with_waiting_thread(module_name=None):
+            seen['thread'] = threading.Thread(target=site.ensure_discovered)
+            seen['thread'].start()
+            seen['thread'].join(0.2)
+            seen.update(pending=site._pending_autodiscover, waiting=seen['thread'].is_alive())
+            site.ensure_discovered()
+            autodiscover(module_name)
+
+        with patch.object(site, 'autodiscover', side_effect=autodiscover_with_waiting_thread) as mock:
+            site.ensure_discovered()
+            seen['thread'].join(5)
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(seen['pending'], 'model_callers')
+        self.assertTrue(seen['waiting'])
+        self.assertFalse(seen['thread'].is_alive())
+        self.assertIsNone(site._pending_autodiscover)
+
+    def test_parse_importtime(self):
+        """Test that -X importtime output is summed by top level package.
+        """
+        lines = [
+            'import time: self [us] | cumulative | imported package',
+            'import time:       120 |        120 |   edc_call_manager.utils',
+            'import time:      1000 |       1120 | edc_call_manager',
+            'import time:        30 |         30 |     json.decoder']
+        self.assertEqual(parse_importtime(lines), {'edc_call_manager': 1120, 'json': 30})
+
+    def test_import_time_app_longest_prefix(self):
+        """Test that a module is counted for the app with the longest module prefix.
+        """
+        app_names = ['django.contrib.admin', 'django.contrib.auth', 'edc_call_manager', 'edc_call']
+        self.assertEqual(get_app_name('django.contrib.auth.models', app_names), 'django.contrib.auth')
+        self.assertEqual(get_app_name('django.contrib.admin', app_names), 'django.contrib.admin')
+        self.assertEqual(get_app_name('edc_call_manager.utils', app_names), 'edc_call_manager')
+        self.assertIsNone(get_app_name('django.db.models', app_names))
+
     def test_register_duplicate(self):
         """Test if re-registering and already registered model throws an error.
         """
@@ -139,6 +299,20 @@ class TestCallManager(TestCase):
                 label='RepeatingTestModelCaller'.lower(),
                 call_status=CLOSED).count(), 1)
 
+    def test_bulk_unschedule_calls(self):
+        """Test that bulk unscheduling closes open calls for many subjects and counts them by label.
+        """
+        for subject_identifier in ['2222222', '3333333']:
+            TestModel.objects.create(subject_identifier=subject_identifier)
+            TestStartModel.objects.create(subject_identifier=subject_identifier)
+        closed = site_model_callers.bulk_unschedule_calls(
+            TestStopModel, ['2222222', TestStopModel(subject_identifier='3333333'), '4444444'])
+        self.assertEqual(closed, {'testmodelcaller': 2})
+        self.assertEqual(Call.objects.filter(label='testmodelcaller', call_status=CLOSED).count(), 2)
+        self.assertEqual(Call.objects.filter(label='repeatingtestmodelcaller', call_status=NEW_CALL).count(), 2)
+        self.assertEqual(
+            site_model_callers.bulk_unschedule_calls(TestStopModel, ['2222222']), {'testmodelcaller': 0})
+
     def test_locator_not_found_for_log(self):
         """Test that an missing locator iformation is set if does not exist for a log.
         """
@@ -170,6 +344,50 @@ class TestCallManager(TestCase):
         log = Log.objects.get(call=call)
         self.assertIn('723333333', log.locator_information)
 
+    def test_locator_fields_projection(self):
+        """Test that only the declared locator fields are formatted, the same for one or many subjects.
+        """
+        class ProjectedLocatorTestModelCaller(LocatorTestModelCaller):
+            label = 'ProjectedLocatorTestModelCaller'
+            locator_fields = ['subject_cell', 'physical_address']
+
+        site_model_callers.reset_registry()
+        site_model_callers.register(ProjectedLocatorTestModelCaller, TestStartModel, verbose=False)
+        Locator.objects.create(
+            subject_identifier=self.subject_identifier,
+            physical_address='Near General Dealer',
+            subject_cell='723333333')
+        self.test_start_model_factory()
+        log = Log.objects.get(call__subject_identifier=self.subject_identifier)
+        self.assertEqual(log.locator_information, '723333333 Near General Dealer')
+        model_caller = site_model_callers.get_model_caller(TestStartModel)
+        self.assertEqual(
+            model_caller.get_locators([self.subject_identifier]),
+            {self.subject_identifier: '723333333 Near General Dealer'})
+        ProjectedLocatorTestModelCaller.locator_fields = []
+        model_caller = ProjectedLocatorTestModelCaller(TestStartModel, None)
+        with self.assertNumQueries(0):
+            self.assertEqual(model_caller.get_locator(TestStartModel(subject_identifier=self.subject_identifier)), '')
+            self.assertEqual(model_caller.get_locators([self.subject_identifier]), {self.subject_identifier: ''})
+        ProjectedLocatorTestModelCaller.locator_fields = ['subject_cell', 'no_such_field']
+        self.assertRaises(ImproperlyConfigured, ProjectedLocatorTestModelCaller, TestStartModel, None)
+
+    def test_locator_update_skips_unchanged_logs(self):
+        """Test that a locator save only updates logs with a different locator digest.
+        """
+        self.test_start_model_factory()
+        locator = CallLogLocator.objects.create(
+            subject_identifier=self.subject_identifier, subject_cell='723333333')
+        log = Log.objects.get(call__subject_identifier=self.subject_identifier)
+        self.assertEqual(log.locator_information, 'Cell 723333333')
+        self.assertNotEqual(log.locator_digest, hashlib.sha256(b'Cell 723333333').hexdigest())
+        self.assertEqual(locator.update_call_log(), 0)
+        log.save()
+        self.assertEqual(locator.update_call_log(), 0)
+        locator.subject_cell = '724444444'
+        locator.save()
+        self.assertEqual(Log.objects.get(pk=log.pk).locator_information, 'Cell 724444444')
+
     def test_log_entry_outcome_call_again(self):
         """Test that a log entry update the call outcome for an alive participant.
         """
@@ -237,6 +455,30 @@ class TestCallManager(TestCase):
         self.assertEqual(Call.objects.filter(
             subject_identifier=subject_identifier, label=call.label).count(), 2)
 
+    def test_earlier_log_entry_does_not_update_call(self):
+        """Test that only the most recent log entry updates the call.
+        """
+        self.test_start_model_factory()
+        call = Call.objects.get(
+            subject_identifier=self.subject_identifier,
+            call_status=NEW_CALL)
+        log = Log.objects.get(call=call)
+        now = get_utcnow()
+        LogEntry.objects.create(
+            log=log,
+            call_datetime=now,
+            contact_type='indirect',
+            survival_status=ALIVE)
+        LogEntry.objects.create(
+            log=log,
+            call_datetime=now - timedelta(hours=1),
+            contact_type='indirect',
+            survival_status=DEAD)
+        call = Call.objects.get(pk=call.pk)
+        self.assertEqual(call.call_status, OPEN_CALL)
+        self.assertEqual(call.call_attempts, 1)
+        self.assertEqual(call.call_datetime, now)
+
     def test_schedule_next_call(self):
         """Test if a next call is schedule once another is closed.
         """
@@ -267,6 +509,555 @@ class TestCallManager(TestCase):
             call_status=NEW_CALL).exclude(pk=call_pk)[0].scheduled
         self.assertGreater(scheduled, call.scheduled)
 
+    def test_rollover_calls_closed_by_update(self):
+        """Test that the rollover schedules the next call for a repeating call closed by an update, once.
+        """
+        self.test_start_model_factory()
+        TestStartModel.objects.create(subject_identifier='2222222')
+        Call.objects.filter(label='repeatingtestmodelcaller').update(call_status=CLOSED)
+        Call.objects.filter(subject_identifier='2222222').update(auto_closed=True)
+        model_caller = site_model_callers.get_model_caller(TestStartModel)
+        self.assertEqual(CallRollover(model_caller, chunk_size=1).rollover(), 1)
+        calls = Call.objects.filter(subject_identifier=self.subject_identifier).order_by('scheduled')
+        self.assertEqual([call.call_status for call in calls], [CLOSED, NEW_CALL])
+        self.assertGreater(calls[1].scheduled, calls[0].scheduled)
+        self.assertEqual(Log.objects.filter(call=calls[1]).count(), 1)
+        self.assertEqual(Call.objects.filter(subject_identifier='2222222').count(), 1)
+        self.assertEqual(CallRollover(model_caller).rollover(), 0)
+
+    def test_bulk_schedule_calls(self):
+        """Test that bulk scheduling creates a call and log for each subject without a call.
+        """
+        TestStartModel.objects.bulk_create([
+            TestStartModel(subject_identifier=f'222222{i}') for i in range(3)])
+        model_caller = site_model_callers.get_model_caller(TestStartModel)
+        scheduler = BulkCallScheduler(model_caller, chunk_size=2)
+        self.assertEqual(scheduler.schedule_missing(), 3)
+        self.assertEqual(Call.objects.filter(label=model_caller.label).count(), 3)
+        self.assertEqual(Log.objects.filter(call__label=model_caller.label).count(), 3)
+        self.assertEqual(BulkCallScheduler(model_caller).schedule_missing(), 0)
+
+    def test_schedule_calls_command_bulk(self):
+        """Test that the schedule_calls command in bulk mode skips subjects with a call.
+        """
+        self.test_start_model_factory()
+        TestStartModel.objects.bulk_create([TestStartModel(subject_identifier='2222222')])
+        call_command('schedule_calls', 'example.teststartmodel', '--bulk', stdout=open(os.devnull, 'w'))
+        self.assertEqual(Call.objects.filter(label='repeatingtestmodelcaller').count(), 2)
+
+    def test_batch_personal_details_and_locators(self):
+        """Test that the batch resolvers return values keyed by subject_identifier.
+        """
+        RegisteredSubject.objects.create(subject_identifier='2222222', first_name='ERIK', initials='EW')
+        Locator.objects.create(subject_identifier='2222222', subject_cell='723333333')
+        model_caller = site_model_callers.get_model_caller(TestStartModel)
+        personal_details = model_caller.personal_details(['2222222', '3333333'])
+        self.assertEqual(personal_details['2222222']['first_name'], 'ERIK')
+        self.assertEqual(personal_details['3333333'], {'subject_identifier': '3333333'})
+        locators = model_caller.get_locators(['2222222', '3333333'])
+        self.assertIn('723333333', locators['2222222'])
+        self.assertEqual(locators['3333333'], 'locator not found.')
+
+    def test_batch_personal_details_from_consents_queries(self):
+        """Test that the consents and their consent_model_fk instances are fetched in one query.
+        """
+        class ConsentFkTestModelCaller(ConsentTestModelCaller):
+            consent_model = (SubjectConsent, 'registered_subject')
+
+        identifiers = ['2222222', '3333333', '4444444']
+        for subject_identifier in identifiers:
+            SubjectConsent.objects.create(
+                subject_identifier=subject_identifier, first_name='MPHO', initials='MK',
+                registered_subject=RegisteredSubject.objects.create(subject_identifier=subject_identifier))
+        model_caller = ConsentFkTestModelCaller(TestStartModel, None)
+        with self.assertNumQueries(1):
+            personal_details = model_caller.personal_details(identifiers + ['5555555'])
+        self.assertEqual(sorted(personal_details), identifiers)
+        self.assertEqual(personal_details['3333333']['registered_subject'].subject_identifier, '3333333')
+
+    def test_unrelated_model_save_not_routed(self):
+        """Test that saving a model not used by a model caller does not reach the call manager.
+        """
+        with patch.object(site_model_callers, 'schedule_calls') as schedule_calls:
+            Locator.objects.create(subject_identifier=self.subject_identifier)
+        schedule_calls.assert_not_called()
+        self.assertEqual(benchmark_post_save_dispatch(Locator, number=10)['queries'], 0)
+
+    def test_reset_registry_disconnects_signals(self):
+        """Test that a start model no longer schedules calls once the registry is reset.
+        """
+        site_model_callers.reset_registry()
+        self.test_model_factory()
+        self.assertEqual(Call.objects.filter(subject_identifier=self.subject_identifier).count(), 0)
+
+    def test_deferred_scheduling_coalesces_on_commit(self):
+        """Test that a deferred model caller schedules once per subject after the transaction commits.
+        """
+        site_model_callers.reset_registry()
+        site_model_callers.register(DeferredTestModelCaller, TestModel, TestStopModel, verbose=False)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.test_model_factory()
+            self.test_model_factory()
+            self.assertEqual(Call.objects.filter(subject_identifier=self.subject_identifier).count(), 0)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(Call.objects.filter(subject_identifier=self.subject_identifier).count(), 1)
+        self.assertEqual(Log.objects.filter(call__subject_identifier=self.subject_identifier).count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_stop_model_factory()
+        self.assertEqual(Call.objects.get(subject_identifier=self.subject_identifier).call_status, CLOSED)
+
+    def test_deferred_scheduling_logs_subjects_without_consent(self):
+        """Test that a deferred model caller logs the subjects it could not schedule for want of a consent.
+        """
+        class DeferredConsentTestModelCaller(ConsentTestModelCaller):
+            defer_scheduling = True
+
+        site_model_callers.reset_registry()
+        site_model_callers.register(DeferredConsentTestModelCaller, TestModel, TestStopModel, verbose=False)
+        with self.assertRaises(ValueError):
+            ConsentTestModelCaller(TestModel, None).schedule_call(TestModel(subject_identifier='2222222'))
+        with self.assertLogs('edc_call_manager.scheduling_queue', level='ERROR') as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.test_model_factory()
+        self.assertIn(self.subject_identifier, logs.output[0])
+        self.assertEqual(Call.objects.filter(subject_identifier=self.subject_identifier).count(), 0)
+
+    def test_deferred_scheduling_discarded_on_rollback(self):
+        """Test that a deferred model caller does not schedule a call if the transaction rolls back.
+        """
+        site_model_callers.reset_registry()
+        site_model_callers.register(DeferredTestModelCaller, TestModel, TestStopModel, verbose=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.test_model_factory()
+                    raise ValueError
+            except ValueError:
+                pass
+            TestModel.objects.create(subject_identifier='2222222')
+        self.assertEqual(Call.objects.filter(subject_identifier=self.subject_identifier).count(), 0)
+        self.assertEqual(Call.objects.filter(subject_identifier='2222222').count(), 1)
+
+    def test_deferred_scheduling_discarded_with_savepoint(self):
+        """Test that intents queued in a savepoint that rolls back are not flushed with the
+        batch of the outer transaction.
+        """
+        site_model_callers.reset_registry()
+        site_model_callers.register(DeferredTestModelCaller, TestModel, TestStopModel, verbose=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                TestModel.objects.create(subject_identifier='2222222')
+                try:
+                    with transaction.atomic():
+                        self.test_model_factory()
+                        raise ValueError
+                except ValueError:
+                    pass
+        self.assertEqual(Call.objects.filter(subject_identifier=self.subject_identifier).count(), 0)
+        self.assertEqual(Call.objects.filter(subject_identifier='2222222').count(), 1)
+
+    def test_scheduler_job_runs_schedule(self):
+        """Test that a model caller with enqueue_jobs adds a job that a worker runs to schedule the call.
+        """
+        site_model_callers.reset_registry()
+        site_model_callers.register(QueuedTestModelCaller, TestModel, TestStopModel, verbose=False)
+        self.test_model_factory()
+        self.assertEqual(Call.objects.filter(subject_identifier=self.subject_identifier).count(), 0)
+        job = SchedulerJob.objects.get(subject_identifier=self.subject_identifier)
+        worker = SchedulerWorker(name='test')
+        worker.run(once=True)
+        self.assertEqual(worker.done, 1)
+        self.assertEqual(SchedulerJob.objects.get(pk=job.pk).status, DONE_JOB)
+        self.assertEqual(Call.objects.filter(subject_identifier=self.subject_identifier).count(), 1)
+
+    def test_scheduler_jobs_run_again_do_not_duplicate_calls(self):
+        """Test that schedule and rollover jobs run a second time, and a second enqueue, add no calls.
+        """
+        TestStartModel.objects.bulk_create([TestStartModel(subject_identifier='2222222')])
+        call_command('schedule_calls', 'example.teststartmodel', '--enqueue', stdout=StringIO())
+        call_command('schedule_calls', 'example.teststartmodel', '--enqueue', stdout=StringIO())
+        self.assertEqual(SchedulerJob.objects.filter(subject_identifier='2222222').count(), 1)
+        worker = SchedulerWorker(name='test')
+        worker.run(once=True)
+        call = Call.objects.get(subject_identifier='2222222')
+        Call.objects.filter(pk=call.pk).update(call_status=CLOSED)
+        SchedulerJob.objects.create(
+            job_type=ROLLOVER, label=call.label, subject_identifier='2222222', call_pk=str(call.pk))
+        worker.run(once=True)
+        self.assertEqual(Call.objects.filter(subject_identifier='2222222').count(), 2)
+        SchedulerJob.objects.update(status=PENDING_JOB)
+        worker.run(once=True)
+        self.assertEqual(worker.done, 4)
+        self.assertEqual(SchedulerJob.objects.exclude(status=DONE_JOB).count(), 0)
+        self.assertEqual(Call.objects.filter(subject_identifier='2222222').count(), 2)
+
+    def test_scheduler_job_without_consent_fails(self):
+        """Test that a schedule job for a subject without a consent fails with the error, without a retry.
+        """
+        site_model_callers.reset_registry()
+        site_model_callers.register(ConsentTestModelCaller, TestStartModel, verbose=False)
+        SubjectConsent.objects.create(subject_identifier='2222222', first_name='MPHO', initials='MK')
+        jobs = [SchedulerJob.objects.create(
+            job_type=SCHEDULE, label='consenttestmodelcaller', subject_identifier=subject_identifier)
+            for subject_identifier in [self.subject_identifier, '2222222']]
+        worker = SchedulerWorker(name='test')
+        worker.run(once=True)
+        self.assertEqual((worker.done, worker.failed), (1, 1))
+        job = SchedulerJob.objects.get(pk=jobs[0].pk)
+        self.assertEqual((job.status, job.attempts), (FAILED_JOB, 1))
+        self.assertIn('require a consent', job.last_error)
+        self.assertEqual(SchedulerJob.objects.get(pk=jobs[1].pk).status, DONE_JOB)
+        self.assertEqual(Call.objects.filter(label='consenttestmodelcaller').count(), 1)
+
+    def test_run_call_scheduler_requires_a_worker(self):
+        """Test that the scheduler command rejects fewer than one worker.
+        """
+        with self.assertRaises(CommandError):
+            call_command('run_call_scheduler', '--workers', '0', '--once', stdout=StringIO())
+
+    def test_scheduler_job_retried_with_backoff(self):
+        """Test that a failed job is returned to pending with a later available datetime.
+        """
+        job = SchedulerJob.objects.create(
+            job_type=ROLLOVER, label='repeatingtestmodelcaller',
+            subject_identifier=self.subject_identifier, call_pk=str(uuid4()))
+        worker = SchedulerWorker(name='test')
+        worker.run(once=True)
+        job = SchedulerJob.objects.get(pk=job.pk)
+        self.assertEqual(job.status, PENDING_JOB)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.available_datetime, get_utcnow())
+        self.assertIn('DoesNotExist', job.last_error)
+
+    def test_call_manager_benchmark_rolls_back(self):
+        """Test that the benchmark reports each path per size and leaves no seeded rows.
+        """
+        model_caller = site_model_callers.get_model_caller(TestStartModel)
+        with patch.object(BulkCallScheduler, 'create_calls', autospec=True,
+                          side_effect=BulkCallScheduler.create_calls) as create_calls:
+            results = CallManagerBenchmark(model_caller, sizes=[30], number=2).run()
+        # schedule_calls has subjects without calls in both the timed and memory passes.
+        self.assertEqual(sum(len(call.args[1]) for call in create_calls.call_args_list), 6)
+        self.assertEqual(
+            [result['path'] for result in results['results']],
+            ['start_model_save', 'stop_model_save', 'log_entry_save', 'schedule_calls',
+             'admin_changelist', 'call_subject_view'])
+        self.assertTrue(all(result['queries'] > 0 for result in results['results']))
+        self.assertEqual(Call.objects.filter(label=model_caller.label).count(), 0)
+        self.assertEqual(TestStartModel.objects.count(), 0)
+
+    def test_instrumentation_records_operations(self):
+        """Test that enabled instrumentation records latency, queries and rows per operation and label.
+        """
+        registry = RegistrySink()
+        enabled, sinks = instrumentation.enabled, instrumentation.sinks
+        with instrumentation.recording(sinks=[registry]):
+            self.test_model_factory()
+            self.test_stop_model_factory()
+        self.assertEqual(instrumentation.enabled, enabled)
+        self.assertIs(instrumentation.sinks, sinks)
+        metrics = registry.snapshot()
+        self.assertEqual(metrics[('schedule_call', 'testmodelcaller')]['count'], 1)
+        self.assertGreater(metrics[('schedule_call', 'testmodelcaller')]['queries'], 0)
+        self.assertEqual(metrics[('unschedule_call', 'testmodelcaller')]['rows'], 1)
+        self.assertEqual(metrics[('model_caller_on_post_save', 'example.testmodel')]['count'], 1)
+        self.assertIn('edc_call_manager_operations_total{operation="schedule_call",label="testmodelcaller"} 1',
+                      metrics_text(registry))
+        TestModel.objects.create(subject_identifier='2222222')
+        self.assertEqual(registry.snapshot()[('schedule_call', 'testmodelcaller')]['count'], 1)
+
+    @override_settings(EDC_CALL_MANAGER_METRICS_TOKEN='s3cret', EDC_CALL_MANAGER_METRICS_ALLOWED_IPS=['10.0.0.5'])
+    def test_metrics_view_allows_token_and_ips(self):
+        """Test that the metrics view is open to a scraper with the token or an allowed IP only.
+        """
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+    def test_export_calls_jsonl_and_csv(self):
+        """Test that the export writes one line per log entry joined with its call, then one
+        per call never attempted, and no names.
+        """
+        self.test_start_model_factory()
+        log = Log.objects.get(call__subject_identifier=self.subject_identifier)
+        for contact_type, hours in [('direct', 1), ('no_contact', 0)]:
+            LogEntry.objects.create(
+                log=log, call_datetime=get_utcnow() - timedelta(hours=hours),
+                contact_type=contact_type, survival_status=ALIVE)
+        TestStartModel.objects.create(subject_identifier='2222222')
+        export = CallExport(label='repeatingtestmodelcaller', export_format=JSONL, chunk_size=1)
+        with self.assertNumQueries(2):
+            rows = [json.loads(line) for line in export.lines()]
+        self.assertEqual(len(rows), 3)
+        entries = [row for row in rows if row['subject_identifier'] == self.subject_identifier]
+        self.assertEqual(sorted(row['contact_type'] for row in entries), ['direct', 'no_contact'])
+        self.assertEqual({row['log_id'] for row in entries}, {str(log.pk)})
+        self.assertEqual(rows[-1]['subject_identifier'], '2222222')
+        self.assertEqual(rows[-1]['call_status'], NEW_CALL)
+        self.assertIsNotNone(rows[-1]['log_id'])
+        self.assertIsNone(rows[-1]['log_entry_id'])
+        self.assertNotIn('first_name', rows[-1])
+        lines = list(CallExport().lines())
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('subject_identifier,label,'))
+
+    def test_call_summary_updated_incrementally(self):
+        """Test that the call summary follows calls as they are created, closed and bulk closed.
+        """
+        self.test_model_factory()
+        TestModel.objects.create(subject_identifier='2222222')
+        figures = get_call_figures(today=date.today())['testmodelcaller']
+        self.assertEqual(figures['new'], 2)
+        self.assertEqual(figures['due_today'], 2)
+        self.assertEqual(figures['overdue'], 0)
+        self.test_stop_model_factory()
+        site_model_callers.bulk_unschedule_calls(TestStopModel, ['2222222'])
+        figures = get_call_figures(today=date.today() + timedelta(days=1))['testmodelcaller']
+        self.assertEqual(figures['new'], 0)
+        self.assertEqual(figures['closed'], 2)
+        self.assertEqual(figures['overdue'], 0)
+        closed = CallSummary.objects.filter(call_status=CLOSED)
+        self.assertEqual(set(closed.values_list('scheduled', flat=True)), {None})
+        self.assertEqual(reconcile_call_summary(), 0)
+
+    def test_call_summary_follows_raw_saves(self):
+        """Test that a deserialized save of an existing call moves its summary count.
+        """
+        self.test_model_factory()
+        data = serializers.serialize('python', Call.objects.filter(subject_identifier=self.subject_identifier))
+        data[0]['fields']['call_status'] = CLOSED
+        for deserialized in serializers.deserialize('python', data):
+            deserialized.save()
+        figures = get_call_figures()['testmodelcaller']
+        self.assertEqual((figures['new'], figures['closed']), (0, 1))
+        self.assertEqual(reconcile_call_summary(), 0)
+
+    def test_reconcile_call_summary_corrects_drift(self):
+        """Test that reconcile corrects summary rows that no longer match the call table.
+        """
+        self.test_model_factory()
+        CallSummary.objects.update(count=5)
+        Call.objects.filter(subject_identifier=self.subject_identifier).update(
+            scheduled=date.today() - timedelta(days=1))
+        self.assertEqual(reconcile_call_summary(), 2)
+        figures = get_call_figures()['testmodelcaller']
+        self.assertEqual(figures['new'], 1)
+        self.assertEqual(figures['overdue'], 1)
+
+    def test_export_call_changes_since_watermark(self):
+        """Test that the changed-since export writes each change once, in call, log, log entry order.
+        """
+        self.test_model_factory()
+        with tempfile.TemporaryDirectory() as output_dir:
+            export = ChangedSinceExport('device-01', output_dir=output_dir, batch_size=1, lag=timedelta(0))
+            paths = export.export()
+            self.assertEqual([os.path.basename(path).split('-')[3] for path in paths], ['call', 'log'])
+            with gzip.open(paths[1], 'rt') as f:
+                self.assertEqual(json.load(f)[-1]['fields']['call'][0], self.subject_identifier)
+            self.assertEqual(export.export(), [])
+            self.test_stop_model_factory()
+            paths = export.export()
+            self.assertIn('-call-', paths[0])
+            export.reset()
+            self.assertGreaterEqual(len(export.export()), 2)
+
+    def test_export_call_changes_includes_held_back_parents(self):
+        """Test that a log is written with its call when the call is held back by the lag.
+        """
+        self.test_model_factory()
+        Call.objects.update(modified=get_utcnow() + timedelta(hours=1))
+        with tempfile.TemporaryDirectory() as output_dir:
+            paths = ChangedSinceExport('device-01', output_dir=output_dir, lag=timedelta(0)).export()
+            self.assertEqual(len(paths), 1)
+            with gzip.open(paths[0], 'rt') as f:
+                self.assertEqual(
+                    [obj['model'] for obj in json.load(f)], ['edc_call_manager.call', 'edc_call_manager.log'])
+            Log.objects.all().delete()
+            Call.objects.all().delete()
+            BulkLoader().load_file(paths[0])
+        self.assertEqual(Log.objects.filter(call__subject_identifier=self.subject_identifier).count(), 1)
+
+    def test_export_call_changes_leaves_out_encrypted_fields(self):
+        """Test that names, initials, locator information and contact notes are not written to the export.
+        """
+        self.test_model_factory()
+        Call.objects.update(first_name='Mpho', initials='MXK')
+        Log.objects.update(locator_information='Plot 1234 near the clinic')
+        LogEntry.objects.create(
+            log=Log.objects.get(), call_datetime=get_utcnow(), contact_type='direct',
+            survival_status=ALIVE, contact_notes='Asked to call after 5pm')
+        with tempfile.TemporaryDirectory() as output_dir:
+            paths = ChangedSinceExport('device-01', output_dir=output_dir, lag=timedelta(0)).export()
+            self.assertEqual(len(paths), 3)
+            for path in paths:
+                with gzip.open(path, 'rt') as f:
+                    content = f.read()
+                for value in ['Mpho', 'MXK', 'Plot 1234 near the clinic', 'Asked to call after 5pm']:
+                    self.assertNotIn(value, content)
+            BulkLoader().load_file(paths[0])
+        call = Call.objects.get()
+        self.assertEqual((call.first_name, call.initials), ('Mpho', 'MXK'))
+
+    def test_bulk_loader_matches_deserialize(self):
+        """Test that the bulk loader resolves the natural keys of a batch together and
+        loads the same rows as deserializing one object at a time.
+        """
+        self.test_start_model_factory()
+        log = Log.objects.get(call__subject_identifier=self.subject_identifier)
+        for contact_type in ['direct', 'indirect', 'indirect', 'direct']:
+            LogEntry.objects.create(
+                log=log, call_datetime=get_utcnow(), contact_type=contact_type, survival_status=ALIVE)
+        data = serializers.serialize(
+            'python', LogEntry.objects.order_by('call_datetime'), use_natural_foreign_keys=True)
+        fields = [field.attname for field in LogEntry._meta.concrete_fields]
+        LogEntry.objects.all().delete()
+        with CaptureQueriesContext(connection) as one_by_one:
+            for deserialized in serializers.deserialize('python', data):
+                deserialized.save()
+        expected = list(LogEntry.objects.order_by('call_datetime').values_list(*fields))
+        LogEntry.objects.all().delete()
+        loader = BulkLoader()
+        with CaptureQueriesContext(connection) as bulk:
+            self.assertEqual(loader.load(data), 4)
+        self.assertEqual(list(LogEntry.objects.order_by('call_datetime').values_list(*fields)), expected)
+        self.assertLess(len(bulk), len(one_by_one))
+        loader.load(data)
+        self.assertEqual((loader.created, loader.updated), (4, 4))
+        self.assertEqual(list(LogEntry.objects.order_by('call_datetime').values_list(*fields)), expected)
+
+    def test_call_admin_call_button_queries(self):
+        """Test that the Call changelist renders call buttons without a query per row.
+        """
+        for subject_identifier in ['2222222', '3333333', '4444444']:
+            TestModel.objects.create(subject_identifier=subject_identifier)
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_superuser('erik', 'erik@example.com', 'pass')
+        call_admin = CallAdmin(Call, edc_call_manager_admin)
+        with self.assertNumQueries(1):
+            buttons = [call_admin.call_button(obj) for obj in call_admin.get_queryset(request)]
+        self.assertEqual(len(buttons), 3)
+
+    def test_call_subject_view_contact_history_queries(self):
+        """Test that the call subject view builds the contact history from a fixed number of queries.
+        """
+        self.test_start_model_factory()
+        log = Log.objects.get(call__subject_identifier=self.subject_identifier)
+        for contact_type, hours in [('direct', 2), ('indirect', 1), ('no_contact', 0)]:
+            LogEntry.objects.create(
+                log=log,
+                call_datetime=get_utcnow() - timedelta(hours=hours),
+                contact_type=contact_type,
+                survival_status=ALIVE)
+        view = CallSubjectCreateView()
+        view.kwargs = {'log_pk': log.pk, 'caller_label': 'repeatingtestmodelcaller'}
+        with self.assertNumQueries(3):
+            contact_history = view.contact_history
+            view.appointments
+        with self.assertNumQueries(0):
+            view.contact_history
+            view.log
+        self.assertEqual(contact_history['attempts'], 3)
+        self.assertEqual(contact_history['direct_contact'], 1)
+        self.assertEqual(contact_history['indirect_contact'], 1)
+        self.assertEqual(contact_history['no_contact'], 1)
+        self.assertFalse(contact_history['do_not_call'])
+
+    def test_due_call_worklist_keyset_pages(self):
+        """Test that the worklist pages through due calls in (scheduled, id) order without repeats.
+        """
+        for index in range(5):
+            TestModel.objects.create(subject_identifier=f'222222{index}')
+            Call.objects.filter(subject_identifier=f'222222{index}').update(
+                scheduled=date.today() - timedelta(days=index % 2))
+        TestModel.objects.create(subject_identifier='3333333')
+        Call.objects.filter(subject_identifier='3333333').update(scheduled=date.today() + timedelta(days=1))
+        TestModel.objects.create(subject_identifier='4444444')
+        Call.objects.filter(subject_identifier='4444444').update(call_status=CLOSED)
+        worklist = DueCallWorklist(label='testmodelcaller')
+        results, cursor = [], None
+        while True:
+            page = worklist.page(cursor=cursor, page_size=2)
+            results.extend(page['results'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(results), 5)
+        self.assertEqual(
+            [(row['scheduled'], row['id']) for row in results],
+            sorted((row['scheduled'], row['id']) for row in results))
+        self.assertTrue(all(row['log_pk'] for row in results))
+
+    def test_call_claims_do_not_overlap(self):
+        """Test that staff members claim different due calls, keep their own claim and
+        take over a lapsed claim.
+        """
+        for index in range(2):
+            TestModel.objects.create(subject_identifier=f'555555{index}')
+            Call.objects.filter(subject_identifier=f'555555{index}').update(scheduled=date.today())
+        first = CallClaim('erik', label='testmodelcaller').claim_next()
+        second = CallClaim('ckgathi', label='testmodelcaller').claim_next()
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(CallClaim('erik', label='testmodelcaller').claim_next().pk, first.pk)
+        self.assertIsNone(CallClaim('jkhan', label='testmodelcaller').claim_next())
+        Call.objects.filter(pk=first.pk).update(claimed_until=get_utcnow() - timedelta(minutes=1))
+        self.assertEqual(CallClaim('jkhan', label='testmodelcaller').claim_next().pk, first.pk)
+        self.assertFalse(CallClaim('erik').release(first))
+        self.assertTrue(CallClaim('jkhan').release(first))
+        self.assertIsNone(Call.objects.get(pk=first.pk).claimed_by)
+
+    def test_next_call_view_claims_on_post(self):
+        """Test that the next call view claims a call with a Log on POST only, and that
+        adding a log entry releases the claim.
+        """
+        User.objects.create_user('erik', 'erik@example.com', 'pass')
+        self.client.login(username='erik', password='pass')
+        TestModel.objects.create(subject_identifier='6666660')
+        TestModel.objects.create(subject_identifier='6666661')
+        Log.objects.filter(call__subject_identifier='6666660').delete()
+        Call.objects.filter(subject_identifier__startswith='666666').update(scheduled=date.today())
+        self.assertEqual(self.client.get('/next-call/testmodelcaller/').status_code, 405)
+        self.assertFalse(Call.objects.filter(claimed_by='erik').exists())
+        log = Log.objects.get(call__subject_identifier='6666661')
+        response = self.client.post('/next-call/testmodelcaller/')
+        self.assertRedirects(
+            response, reverse('call-subject-add', kwargs={'caller_label': 'testmodelcaller', 'log_pk': log.pk}),
+            fetch_redirect_response=False)
+        self.assertEqual(Call.objects.get(claimed_by='erik').pk, log.call.pk)
+        request = RequestFactory().post('/')
+        request.user = User.objects.get(username='erik')
+        view = CallSubjectCreateView()
+        view.setup(request, log_pk=log.pk, caller_label='testmodelcaller')
+        form = LogEntryForm(data={
+            'log': log.pk, 'call_reason': 'reminder', 'call_datetime': get_utcnow(),
+            'contact_type': 'direct', 'survival_status': ALIVE, 'may_call': YES})
+        self.assertTrue(form.is_valid(), form.errors)
+        view.form_valid(form)
+        self.assertFalse(Call.objects.filter(claimed_by='erik').exists())
+
+    def test_next_scheduled_date_skips_weekends_and_holidays(self):
+        """Test that the next scheduled date is rolled forward to a business day.
+        """
+        class HolidayTestModelCaller(RepeatingTestModelCaller):
+            holidays = [date(2024, 1, 8)]
+        model_caller = HolidayTestModelCaller(TestStartModel, TestStopTwoModel)
+        # Monday 2024-01-01 + 1 week is a holiday, so the call moves to Tuesday.
+        self.assertEqual(model_caller.get_next_scheduled_date(date(2024, 1, 1)), date(2024, 1, 9))
+        # Saturday 2024-01-06 + 1 week is a Saturday, so the call moves to Monday.
+        self.assertEqual(
+            model_caller.get_next_scheduled_dates([date(2024, 1, 6), date(2024, 1, 10)]),
+            [date(2024, 1, 15), date(2024, 1, 17)])
+
+    def test_next_scheduled_date_yearly(self):
+        """Test that a yearly interval returns a date.
+        """
+        class YearlyTestModelCaller(RepeatingTestModelCaller):
+            interval = YEARLY
+        model_caller = YearlyTestModelCaller(TestStartModel, TestStopTwoModel)
+        self.assertEqual(model_caller.get_next_scheduled_date(date(2024, 2, 29)), date(2025, 2, 28))
+
     def test_call_serialize(self):
         """Test if the call object is serializeble.
         """
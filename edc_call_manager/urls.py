@@ -5,7 +5,8 @@ from django.urls.conf import path
 
 from edc_constants.constants import UUID_PATTERN
 
-from .views import HomeView, CallSubjectUpdateView, CallSubjectDeleteView, CallSubjectCreateView
+from .views import HomeView, CallSubjectUpdateView, CallSubjectDeleteView, CallSubjectCreateView, DueCallsView
+from .views import ExportCallsView, MetricsView, NextCallView
 from .admin_site import edc_call_manager_admin
 
 app_name = 'edc_call_manager'
@@ -17,4 +18,11 @@ urlpatterns = [
     re_path(r'^' + f'{app_name}/(?P<caller_label>\\w+)/'
             f'(?P<log_pk>{UUID_PATTERN.pattern})//add/',
             CallSubjectCreateView.as_view(), name='call-subject-add'),
+    path(r'worklist/', DueCallsView.as_view(), name='due-calls'),
+    path(r'worklist/<str:caller_label>/', DueCallsView.as_view(), name='due-calls'),
+    path(r'next-call/', NextCallView.as_view(), name='next-call'),
+    path(r'next-call/<str:caller_label>/', NextCallView.as_view(), name='next-call'),
+    path(r'metrics/', MetricsView.as_view(), name='metrics'),
+    path(r'export/', ExportCallsView.as_view(), name='export-calls'),
+    path(r'export/<str:caller_label>/', ExportCallsView.as_view(), name='export-calls'),
 ]
@@ -0,0 +1,25 @@
+from django.utils.crypto import salted_hmac
+
+
+def chunked(iterable, chunk_size):
+    """Yields lists of at most `chunk_size` items from iterable."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_locator_digest(locator_information):
+    """Returns a keyed HMAC-SHA256 hex digest of a locator string or None.
+
+    Stored on the Log so an unchanged locator does not have to be compared by
+    decrypting `locator_information`. The digest is keyed with settings.SECRET_KEY
+    so it cannot be reversed by hashing guesses, e.g. every phone number."""
+    if locator_information is None:
+        return None
+    return salted_hmac(
+        'edc_call_manager.locator_digest', locator_information, algorithm='sha256').hexdigest()
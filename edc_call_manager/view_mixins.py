@@ -2,9 +2,10 @@ from itertools import chain
 
 from django.apps import apps as django_apps
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
+from django.db.models import Count, Q
 from django.urls.base import reverse
 from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
 
 from edc_base.utils import formatted_age
 from edc_base.view_mixins import EdcBaseViewMixin
@@ -15,10 +16,12 @@ from .caller_site import site_model_callers
 from .forms import LogEntryForm
 
 
-app_config = django_apps.get_app_config('edc_call_manager')
-Call = django_apps.get_model(app_config.label, 'call')
-Log = django_apps.get_model(app_config.label, 'log')
-LogEntry = django_apps.get_model(app_config.label, 'logentry')
+class UrlNamespaceViewMixin:
+
+    def url_name(self, name):
+        """Returns the url name in the namespace this view was resolved in, if any."""
+        namespace = self.request.resolver_match.namespace
+        return f'{namespace}:{name}' if namespace else name
 
 
 class CallSubjectViewMixin(EdcBaseViewMixin):
@@ -32,9 +35,13 @@ class CallSubjectViewMixin(EdcBaseViewMixin):
     def dispatch(self, *args, **kwargs):
         return super(CallSubjectViewMixin, self).dispatch(*args, **kwargs)
 
+    @property
+    def call_manager_app_config(self):
+        return django_apps.get_app_config('edc_call_manager')
+
     def get_success_url(self):
         return reverse('edc_call_manager_admin:{}_{}_changelist'.format(
-            *Call._meta.label_lower.split('.')))
+            *self.call_manager_app_config.call_model._meta.label_lower.split('.')))
 
     def get_form_kwargs(self):
         kwargs = super(CallSubjectViewMixin, self).get_form_kwargs()
@@ -42,14 +49,15 @@ class CallSubjectViewMixin(EdcBaseViewMixin):
         return kwargs
 
     def get_object(self):
-        return LogEntry.objects.get(pk=self.kwargs.get('pk'))
+        return self.call_manager_app_config.log_entry_model.objects.get(pk=self.kwargs.get('pk'))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        subject_identifier = self.log.call.subject_identifier
-        call_status = self.log.call.get_call_status_display()
-        if app_config.verbose_name not in context.get('project_name'):
-            context.update({'project_name': context.get('project_name') + ': ' + app_config.verbose_name})
+        subject_identifier = self.call.subject_identifier
+        call_status = self.call.get_call_status_display()
+        verbose_name = self.call_manager_app_config.verbose_name
+        if verbose_name not in context.get('project_name'):
+            context.update({'project_name': context.get('project_name') + ': ' + verbose_name})
         context.update(
             instructions=self.instructions,
             show_instructions=self.show_instructions,
@@ -65,28 +73,55 @@ class CallSubjectViewMixin(EdcBaseViewMixin):
         )
         return context
 
-    @property
+    @cached_property
     def log(self):
-        return Log.objects.get(pk=self.kwargs.get('log_pk'))
+        return self.call_manager_app_config.log_model.objects.select_related('call').get(pk=self.kwargs.get('log_pk'))
 
-    @property
+    @cached_property
+    def call(self):
+        return self.log.call
+
+    @cached_property
     def model_caller(self):
         return site_model_callers.get_model_caller(self.kwargs.get('caller_label'))
 
+    @cached_property
+    def consent(self):
+        return self.model_caller.consent(self.call.subject_identifier)
+
+    @cached_property
+    def subject(self):
+        return self.model_caller.subject(self.call.subject_identifier)
+
+    @cached_property
+    def locator(self):
+        try:
+            locator = self.locator_model.objects.get(
+                subject_identifier=self.call.subject_identifier)
+        except self.locator_model.DoesNotExist:
+            locator = None
+        return locator
+
+    @cached_property
+    def log_entries(self):
+        """Returns the log entries for this log, most recent first."""
+        log_entry_model = self.call_manager_app_config.log_entry_model
+        return list(log_entry_model.objects.filter(log=self.log).order_by('-call_datetime'))
+
     @property
     def demographics(self):
         dob = None
-        first_name = self.log.call.first_name or ''
+        first_name = self.call.first_name or ''
         gender = None
         last_name = None
-        consent = self.model_caller.consent(self.log.call.subject_identifier)
+        consent = self.consent
         if consent:
             dob = consent.dob
             first_name = consent.first_name
             gender = consent.get_gender_display()
             last_name = consent.last_name
         else:
-            subject = self.model_caller.subject(self.log.call.subject_identifier)
+            subject = self.subject
             if subject:
                 dob = self.get_attr(subject, 'dob')
                 first_name = self.get_attr(subject, 'first_name') or first_name
@@ -105,8 +140,7 @@ class CallSubjectViewMixin(EdcBaseViewMixin):
     def appointments(self):
         appointments = []
         appt = {}
-        history = LogEntry.objects.filter(log=self.log).order_by('-call_datetime')
-        for obj in history:
+        for obj in self.log_entries:
             try:
                 appt = {
                     'appt_date': obj.appt_date.strftime('%Y-%m-%d'),
@@ -130,47 +164,32 @@ class CallSubjectViewMixin(EdcBaseViewMixin):
         return self.model_caller.subject_model
 
     def get_contact_information(self):
-        try:
-            contact_information = self.locator_model.objects.get(
-                subject_identifier=self.log.call.subject_identifier).__dict__
-        except self.locator_model.DoesNotExist:
-            contact_information = None
-        return contact_information
+        return self.locator.__dict__ if self.locator else None
+
+    @cached_property
+    def contact_counts(self):
+        """Returns the contact counts for this log from one conditional aggregation query."""
+        return self.call_manager_app_config.log_entry_model.objects.filter(log=self.log).aggregate(
+            attempts=Count('pk'),
+            direct_contact=Count('pk', filter=Q(contact_type=DIRECT_CONTACT)),
+            indirect_contact=Count('pk', filter=Q(contact_type=INDIRECT_CONTACT)),
+            no_contact=Count('pk', filter=Q(contact_type=NO_CONTACT)),
+            do_not_call=Count('pk', filter=Q(may_call=NO)))
 
     @property
     def contact_history(self):
-        history = LogEntry.objects.filter(log=self.log).order_by('-call_datetime')
+        counts = self.contact_counts
         contact_history = {
-            'attempts': history.filter(log=self.log).count(),
-            'direct_contact': history.filter(log=self.log, contact_type=DIRECT_CONTACT).count(),
-            'indirect_contact': history.filter(log=self.log, contact_type=INDIRECT_CONTACT).count(),
-            'no_contact': history.filter(log=self.log, contact_type=NO_CONTACT).count(),
-            'do_not_call': self.do_not_call(history),
-            'call_closed': self.call_closed(history),
-            'contact_history': history,
+            'attempts': counts['attempts'],
+            'direct_contact': counts['direct_contact'],
+            'indirect_contact': counts['indirect_contact'],
+            'no_contact': counts['no_contact'],
+            'do_not_call': counts['do_not_call'] > 0,
+            'call_closed': counts['attempts'] > 0 and self.call.call_status == CLOSED,
+            'contact_history': self.log_entries,
         }
         return contact_history
 
-    def do_not_call(self, history):
-        try:
-            history.get(may_call=NO)
-            do_not_call = True
-        except MultipleObjectsReturned:
-            do_not_call = True
-        except ObjectDoesNotExist:
-            do_not_call = False
-        return do_not_call
-
-    def call_closed(self, history):
-        try:
-            history.get(log__call__call_status=CLOSED)
-            call_closed = True
-        except MultipleObjectsReturned:
-            call_closed = True
-        except ObjectDoesNotExist:
-            call_closed = False
-        return call_closed
-
     def get_attr(self, obj, name):
         """Safely try to get the attr."""
         try:
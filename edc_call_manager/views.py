@@ -1,8 +1,14 @@
-import jsonpickle
-
 from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http.response import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.http.response import JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect
 from django.urls.base import reverse_lazy
-from django.views.generic.base import TemplateView
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.views.generic.base import TemplateView, View
 from django.views.generic.edit import UpdateView, DeleteView, CreateView
 
 from edc_base.modelform_mixins import AuditFieldsMixin
@@ -10,26 +16,30 @@ from edc_base.view_mixins import EdcBaseViewMixin
 from edc_constants.constants import ALIVE
 from edc_protocol.view_mixins import EdcProtocolViewMixin
 
+from .call_summary import get_call_figures
 from .caller_site import site_model_callers
-from .view_mixins import CallSubjectViewMixin
-
-app_config = django_apps.get_app_config('edc_call_manager')
-Call = django_apps.get_model(app_config.label, 'call')
-Log = django_apps.get_model(app_config.label, 'log')
-LogEntry = django_apps.get_model(app_config.label, 'logentry')
+from .claims import CallClaim
+from .export import CallExport
+from .instrumentation import metrics_text
+from .view_mixins import CallSubjectViewMixin, UrlNamespaceViewMixin
+from .worklist import DueCallWorklist, WorklistCursorError
 
-
-class HomeView(EdcBaseViewMixin, EdcProtocolViewMixin, TemplateView):
+class HomeView(UrlNamespaceViewMixin, EdcBaseViewMixin, EdcProtocolViewMixin, TemplateView):
 
     template_name = 'edc_call_manager/home.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context.update({'model_callers': site_model_callers.model_callers.values()})
+        app_config = django_apps.get_app_config('edc_call_manager')
+        model_callers = site_model_callers.model_callers.values()
+        call_figures = get_call_figures(labels=[model_caller.label for model_caller in model_callers])
+        context.update({'model_callers': [
+            (model_caller, call_figures.get(model_caller.label, {})) for model_caller in model_callers]})
         if app_config.verbose_name not in context.get('project_name'):
             context.update({'project_name': context.get('project_name') + ': ' + app_config.verbose_name})
         context.update({'app_label': app_config.label})
-        context.update({'context': jsonpickle.encode(context)})
+        context.update({'next_call_url_name': self.url_name('next-call')})
+        context.update({'context': site_model_callers.registry_json})
         return context
 
 
@@ -43,7 +53,9 @@ class CallSubjectCreateView(CallSubjectViewMixin, EdcProtocolViewMixin, AuditFie
     def form_valid(self, form):
         form.instance.log = self.log
         form.instance.survival_status = ALIVE
-        return super(CallSubjectCreateView, self).form_valid(form)
+        response = super(CallSubjectCreateView, self).form_valid(form)
+        CallClaim(self.request.user.username).release(self.call)
+        return response
 
     def form_invalid(self, form):
         return super(CallSubjectCreateView, self).form_invalid(form)
@@ -65,3 +77,96 @@ class CallSubjectUpdateView(CallSubjectViewMixin, EdcProtocolViewMixin, AuditFie
 class CallSubjectDeleteView(CallSubjectViewMixin, EdcProtocolViewMixin, AuditFieldsMixin, DeleteView):
 
     success_url = reverse_lazy('call-subject-delete')
+
+
+class DueCallsView(View):
+
+    """Returns a page of the due calls worklist as JSON.
+
+    GET parameters are `label`, `cursor` and `page_size`. See DueCallWorklist."""
+
+    @method_decorator(login_required)
+    def dispatch(self, *args, **kwargs):
+        return super().dispatch(*args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        worklist = DueCallWorklist(label=request.GET.get('label') or kwargs.get('caller_label'))
+        try:
+            page_size = int(request.GET.get('page_size') or worklist.page_size)
+            page = worklist.page(cursor=request.GET.get('cursor'), page_size=page_size)
+        except (ValueError, WorklistCursorError) as e:
+            return HttpResponseBadRequest(str(e))
+        return JsonResponse(page)
+
+
+class MetricsView(View):
+
+    """Returns the in-process instrumentation metrics as Prometheus text.
+
+    Open to a scraper that sends `Authorization: Bearer <EDC_CALL_MANAGER_METRICS_TOKEN>`,
+    to clients in EDC_CALL_MANAGER_METRICS_ALLOWED_IPS and to logged in staff. Other
+    requests get 403.
+
+    Metrics are only collected if instrumentation is enabled. See instrumentation."""
+
+    def get(self, request, *args, **kwargs):
+        if not self.is_allowed(request):
+            return HttpResponseForbidden()
+        return HttpResponse(metrics_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    def is_allowed(self, request):
+        token = getattr(settings, 'EDC_CALL_MANAGER_METRICS_TOKEN', None)
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        if token and constant_time_compare(authorization, f'Bearer {token}'):
+            return True
+        if request.META.get('REMOTE_ADDR') in getattr(settings, 'EDC_CALL_MANAGER_METRICS_ALLOWED_IPS', []):
+            return True
+        return request.user.is_authenticated and request.user.is_staff
+
+
+class ExportCallsView(View):
+
+    """Streams log entries joined with their log and call, and calls without a log entry, as CSV or JSONL.
+
+    GET parameters are `format` (csv or jsonl) and `label`. See CallExport."""
+
+    @method_decorator(login_required)
+    def dispatch(self, *args, **kwargs):
+        return super().dispatch(*args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            export = CallExport(
+                label=request.GET.get('label') or kwargs.get('caller_label'),
+                export_format=request.GET.get('format'))
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        response = StreamingHttpResponse(export.lines(), content_type=export.content_type)
+        response['Content-Disposition'] = 'attachment; filename="calls.{}"'.format(export.export_format)
+        return response
+
+
+class NextCallView(UrlNamespaceViewMixin, View):
+
+    """Claims the next due call for the user on POST and redirects to the log entry
+    form of its log.
+
+    Redirects home if there is no unclaimed due call. See CallClaim."""
+
+    @method_decorator(login_required)
+    def dispatch(self, *args, **kwargs):
+        return super().dispatch(*args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        claim = CallClaim(request.user.username, label=kwargs.get('caller_label'))
+        call = claim.claim_next()
+        log_pk = None
+        if call:
+            log_pk = claim.log_model.objects.filter(call=call).order_by(
+                '-log_datetime').values_list('pk', flat=True).first()
+            if not log_pk:
+                claim.release(call)
+        if not log_pk:
+            messages.info(request, 'There are no unclaimed calls due.', fail_silently=True)
+            return redirect(self.url_name('home_url'))
+        return redirect(self.url_name('call-subject-add'), caller_label=call.label, log_pk=log_pk)
@@ -0,0 +1,86 @@
+import base64
+
+from datetime import date
+
+from django.apps import apps as django_apps
+from django.db.models import OuterRef, Q, Subquery
+
+from edc_constants.constants import CLOSED
+
+
+class WorklistCursorError(Exception):
+    pass
+
+
+class DueCallWorklist:
+    """A class that returns pages of new and open calls scheduled for today or earlier.
+
+    Pages are ordered on (scheduled, id) and fetched with keyset pagination, so each
+    page costs the same however deep into the backlog it is. Pass the `next_cursor`
+    of one page as the `cursor` of the next.
+
+    For example:
+
+        worklist = DueCallWorklist(label='antenatal-to-postnatal')
+        page = worklist.page()
+        next_page = worklist.page(cursor=page['next_cursor'])
+    """
+
+    fields = [
+        'id',
+        'subject_identifier',
+        'label',
+        'scheduled',
+        'call_status',
+        'call_attempts',
+        'call_outcome',
+        'initials',
+        'log_pk',
+    ]
+    page_size = 50
+    max_page_size = 500
+
+    def __init__(self, label=None, call_model=None, log_model=None, today=None):
+        app_config = django_apps.get_app_config('edc_call_manager')
+        self.label = label
+        self.call_model = call_model or django_apps.get_model(app_config.label, 'call')
+        self.log_model = log_model or django_apps.get_model(app_config.label, 'log')
+        self.today = today or date.today()
+
+    @property
+    def queryset(self):
+        # not closed, i.e. new or open, as in the condition of the partial due call indexes.
+        queryset = self.call_model.objects.filter(
+            ~Q(call_status=CLOSED),
+            scheduled__lte=self.today)
+        if self.label:
+            queryset = queryset.filter(label=self.label)
+        return queryset
+
+    def page(self, cursor=None, page_size=None):
+        """Returns a dictionary of `results`, a list of dictionaries, and `next_cursor`,
+        None on the last page."""
+        page_size = min(page_size or self.page_size, self.max_page_size)
+        queryset = self.queryset
+        if cursor:
+            scheduled, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(scheduled__gt=scheduled) | Q(scheduled=scheduled, pk__gt=pk))
+        queryset = queryset.annotate(
+            log_pk=Subquery(self.log_model.objects.filter(call=OuterRef('pk')).order_by().values('pk')[:1]))
+        results = list(queryset.order_by('scheduled', 'pk').values(*self.fields)[:page_size + 1])
+        next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            next_cursor = self.encode_cursor(results[-1]['scheduled'], results[-1]['id'])
+        return {'results': results, 'next_cursor': next_cursor}
+
+    def encode_cursor(self, scheduled, pk):
+        value = f'{scheduled.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            scheduled, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return date.fromisoformat(scheduled), self.call_model._meta.pk.to_python(pk)
+        except Exception as e:
+            raise WorklistCursorError(f'Invalid worklist cursor. Got {cursor}. {e}')
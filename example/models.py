@@ -1,8 +1,10 @@
 from django.db import models
 from django.utils import timezone
 from edc_base.model_mixins import BaseUuidModel
+from edc_call_manager.mixins import CallLogLocatorMixin
 from edc_call_manager.model_mixins import CallModelMixin, LogModelMixin, LogEntryModelMixin
 from edc_locator.model_mixins import LocatorModelMixin
+from edc_registration.models import RegisteredSubject
 
 
 class TestModel(BaseUuidModel):
@@ -28,6 +30,45 @@ class Locator(LocatorModelMixin, BaseUuidModel):
         app_label = 'example'
 
 
+class CallLogLocator(CallLogLocatorMixin, LocatorModelMixin, BaseUuidModel):
+
+    subject_identifier = models.CharField(
+        max_length=25)
+
+    def get_call_log_options(self):
+        return dict(call__subject_identifier=self.subject_identifier)
+
+    def to_string(self):
+        return 'Cell {}'.format(self.subject_cell)
+
+    class Meta:
+        app_label = 'example'
+
+
+class SubjectConsent(BaseUuidModel):
+
+    subject_identifier = models.CharField(
+        max_length=25)
+
+    first_name = models.CharField(
+        max_length=25,
+        null=True)
+
+    initials = models.CharField(
+        max_length=3,
+        null=True)
+
+    registered_subject = models.ForeignKey(
+        RegisteredSubject,
+        on_delete=models.PROTECT,
+        null=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        app_label = 'example'
+
+
 class TestStartModel(BaseUuidModel):
 
     subject_identifier = models.CharField(
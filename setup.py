@@ -23,7 +23,7 @@ setup(
     zip_safe=False,
     keywords='EDC django call log',
     install_requires=[
-        'jsonpickle',
+        'numpy',
     ],
     classifiers=[
         'Environment :: Web Environment',